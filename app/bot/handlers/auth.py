@@ -1,5 +1,7 @@
 """Обработчики управления API-токенами Wildberries (только авторизация)"""
 
+import asyncio
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, StateFilter
@@ -8,7 +10,7 @@ from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
 
 from app.services.wildberries_api import wb_api, WildberriesAPIError, WildberriesAuthError
-from app.services.wb_web_auth import get_wb_auth_service, cleanup_wb_auth_service, WBWebAuthError
+from app.services.wb_web_auth import get_wb_auth_service, cleanup_wb_auth_service, WBWebAuthError, WBBrowserBusyError
 from app.database.database import AsyncSessionLocal
 from app.database.repositories.user_repo import UserRepository
 
@@ -108,48 +110,47 @@ async def process_api_token(message: Message, state: FSMContext):
     
     try:
         # Проверяем токен через API
-        async with wb_api:
-            is_valid = await wb_api.validate_api_token(api_token)
-            
-            if not is_valid:
-                await processing_msg.edit_text(
-                    "❌ <b>Неверный API-токен</b>\n\n"
-                    "Проверьте правильность токена и его права доступа.\n"
-                    "Попробуйте еще раз или нажмите /add_token",
-                    parse_mode="HTML"
-                )
-                await state.clear()
-                return
-            
-            # Получаем информацию о кабинете
-            cabinet_info = await wb_api.get_cabinet_info(api_token)
-            seller_info = cabinet_info.get('seller_info', {})
-            
-            # Сохраняем токен в базу данных
-            async with AsyncSessionLocal() as session:
-                user_repo = UserRepository(session)
-                
-                # Получаем или создаем пользователя
-                user = await user_repo.get_or_create_user(
-                    telegram_id=message.from_user.id,
-                    username=message.from_user.username,
-                    first_name=message.from_user.first_name,
-                    last_name=message.from_user.last_name
-                )
-                
-                # Сохраняем токен
-                await user_repo.save_wb_token(user, api_token)
-            
-            # Формируем информацию для отображения
-            token_status = "✅ Активен" if cabinet_info.get('api_token_valid') else "❌ Неактивен"
-            test_status = "✅ Пройден" if cabinet_info.get('token_test_passed') else "❌ Не пройден"
+        is_valid = await wb_api.validate_api_token(api_token)
+        
+        if not is_valid:
+            await processing_msg.edit_text(
+                "❌ <b>Неверный API-токен</b>\n\n"
+                "Проверьте правильность токена и его права доступа.\n"
+                "Попробуйте еще раз или нажмите /add_token",
+                parse_mode="HTML"
+            )
+            await state.clear()
+            return
+        
+        # Получаем информацию о кабинете
+        cabinet_info = await wb_api.get_cabinet_info(api_token)
+        seller_info = cabinet_info.get('seller_info', {})
+        
+        # Сохраняем токен в базу данных
+        async with AsyncSessionLocal() as session:
+            user_repo = UserRepository(session)
             
-            # Извлекаем основную информацию о продавце согласно API документации
-            seller_name = seller_info.get('name', 'Не указано')
-            seller_id = seller_info.get('sid', 'Не указано')
-            trade_mark = seller_info.get('tradeMark', 'Не указано')
+            # Получаем или создаем пользователя
+            user = await user_repo.get_or_create_user(
+                telegram_id=message.from_user.id,
+                username=message.from_user.username,
+                first_name=message.from_user.first_name,
+                last_name=message.from_user.last_name
+            )
             
-            success_text = f"""
+            # Сохраняем токен
+            await user_repo.save_wb_token(user, api_token)
+        
+        # Формируем информацию для отображения
+        token_status = "✅ Активен" if cabinet_info.get('api_token_valid') else "❌ Неактивен"
+        test_status = "✅ Пройден" if cabinet_info.get('token_test_passed') else "❌ Не пройден"
+        
+        # Извлекаем основную информацию о продавце согласно API документации
+        seller_name = seller_info.get('name', 'Не указано')
+        seller_id = seller_info.get('sid', 'Не указано')
+        trade_mark = seller_info.get('tradeMark', 'Не указано')
+        
+        success_text = f"""
 ✅ <b>API-токен успешно добавлен!</b>
 
 📊 <b>Информация о продавце:</b>
@@ -169,13 +170,13 @@ async def process_api_token(message: Message, state: FSMContext):
 
 
             """
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="📊 Информация о кабинете", callback_data="cabinet_info")],
-                [InlineKeyboardButton(text="📊 Мои мониторинги", callback_data="my_monitorings")]
-            ])
-            
-            await processing_msg.edit_text(success_text, reply_markup=keyboard, parse_mode="HTML")
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📊 Информация о кабинете", callback_data="cabinet_info")],
+            [InlineKeyboardButton(text="📊 Мои мониторинги", callback_data="my_monitorings")]
+        ])
+        
+        await processing_msg.edit_text(success_text, reply_markup=keyboard, parse_mode="HTML")
             
     except WildberriesAuthError as e:
         await processing_msg.edit_text(
@@ -329,7 +330,7 @@ async def start_phone_auth(callback: CallbackQuery, state: FSMContext):
             is_session_valid = False
             if session_data:
                 try:
-                    wb_auth_for_test = get_wb_auth_service(user_id=user_id)
+                    wb_auth_for_test = await get_wb_auth_service(user_id=user_id)
                     is_session_valid = await wb_auth_for_test.test_session(session_data)
                     
                     if is_session_valid:
@@ -340,6 +341,19 @@ async def start_phone_auth(callback: CallbackQuery, state: FSMContext):
                         await user_repo.clear_phone_auth(user)
                         await session.commit()
                         
+                except WBBrowserBusyError:
+                    # Проверка не выполнена из-за нагрузки: сохраненную сессию не трогаем
+                    logger.warning(f"No free browser to test session for user {user_id}")
+                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                        [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="phone_auth")]
+                    ])
+                    await callback.message.edit_text(
+                        "⏳ <b>Сервис перегружен</b>\n\n"
+                        "Не удалось проверить сессию: все браузеры заняты. Попробуйте через минуту.",
+                        reply_markup=keyboard,
+                        parse_mode="HTML"
+                    )
+                    return
                 except Exception as e:
                     logger.error(f"Error testing session for user {user_id}: {e}")
                     is_session_valid = False
@@ -417,7 +431,7 @@ async def process_phone_number(message: Message, state: FSMContext):
     
     try:
         # Запрашиваем SMS код
-        wb_auth = get_wb_auth_service(user_id=user_id)
+        wb_auth = await get_wb_auth_service(user_id=user_id)
         await wb_auth.start_session()  # Начинаем сессию браузера
         
         success = await wb_auth.request_sms_code(phone)
@@ -508,7 +522,7 @@ async def process_sms_code(message: Message, state: FSMContext):
             return
         
         # Проверяем SMS код и получаем данные сессии (используем существующую сессию браузера)
-        wb_auth = get_wb_auth_service(user_id=user_id)
+        wb_auth = await get_wb_auth_service(user_id=user_id)
         success, auth_data = await wb_auth.verify_sms_code(sms_code)
         
         # Закрываем браузер после завершения авторизации
@@ -716,12 +730,14 @@ async def cmd_reset_all_auth(message: Message):
             user_repo = UserRepository(session)
             users = await user_repo.get_all_users()
             
-            reset_count = 0
-            for user in users:
-                if user.has_phone_auth():
-                    await user_repo.remove_phone_auth(user)
-                    await cleanup_wb_auth_service(user.telegram_id)
-                    reset_count += 1
+            # Сбрасываем данные в БД одним запросом, браузеры закрываем параллельно
+            telegram_ids = [user.telegram_id for user in users if user.has_phone_auth()]
+            await user_repo.bulk_remove_phone_auth(telegram_ids)
+            await asyncio.gather(
+                *(cleanup_wb_auth_service(telegram_id) for telegram_id in telegram_ids),
+                return_exceptions=True
+            )
+            reset_count = len(telegram_ids)
             
             await message.answer(
                 f"✅ <b>Авторизация сброшена</b>\n\n"
@@ -64,24 +64,23 @@ async def cmd_cabinet_info(event: Message | CallbackQuery):
                 return
             
             # Получаем информацию о кабинете через API
-            async with wb_api:
-                cabinet_info = await wb_api.get_cabinet_info(wb_token)
-                seller_info = cabinet_info.get('seller_info', {})
-                
-                # Формируем информацию для отображения
-                token_status = "✅ Активен" if cabinet_info.get('api_token_valid') else "❌ Неактивен"
-                test_status = "✅ Пройден" if cabinet_info.get('token_test_passed') else "❌ Не пройден"
-                
-                # Информация о продавце из seller-info API согласно документации
-                seller_name = seller_info.get('name', 'Не указано')
-                seller_id = seller_info.get('sid', 'Не указано')
-                trade_mark = seller_info.get('tradeMark', 'Не указано')
-                
-                # Информация о токене
-                token_created = user.wb_token_created_at.strftime('%d.%m.%Y %H:%M') if user.wb_token_created_at else "Неизвестно"
-                token_last_used = user.wb_token_last_used_at.strftime('%d.%m.%Y %H:%M') if user.wb_token_last_used_at else "Никогда"
-                
-                text = f"""
+            cabinet_info = await wb_api.get_cabinet_info(wb_token)
+            seller_info = cabinet_info.get('seller_info', {})
+            
+            # Формируем информацию для отображения
+            token_status = "✅ Активен" if cabinet_info.get('api_token_valid') else "❌ Неактивен"
+            test_status = "✅ Пройден" if cabinet_info.get('token_test_passed') else "❌ Не пройден"
+            
+            # Информация о продавце из seller-info API согласно документации
+            seller_name = seller_info.get('name', 'Не указано')
+            seller_id = seller_info.get('sid', 'Не указано')
+            trade_mark = seller_info.get('tradeMark', 'Не указано')
+            
+            # Информация о токене
+            token_created = user.wb_token_created_at.strftime('%d.%m.%Y %H:%M') if user.wb_token_created_at else "Неизвестно"
+            token_last_used = user.wb_token_last_used_at.strftime('%d.%m.%Y %H:%M') if user.wb_token_last_used_at else "Никогда"
+            
+            text = f"""
 📊 <b>Информация о продавце</b>
 
 👤 <b>Данные продавца:</b>
@@ -103,17 +102,17 @@ async def cmd_cabinet_info(event: Message | CallbackQuery):
 • Удалить токен - удалить токен для автобронирования
 • Добавить новый токен - добавить новый токен для автобронирования
                 """
-                
-                keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="📊 Мои мониторинги", callback_data="my_monitorings")],
-                    [InlineKeyboardButton(text="🤖 Автобронирование", callback_data="auto_booking")],
-                    [InlineKeyboardButton(text="👥 Аккаунты", callback_data="view_accounts")],
-                    [InlineKeyboardButton(text="🏪 Обновить список складов", callback_data="update_warehouses")],
-                    [InlineKeyboardButton(text="🗑 Удалить токен", callback_data="remove_token")],
-                    [InlineKeyboardButton(text="➕ Добавить новый токен", callback_data="add_token")]
-                ])
-                
-                await processing_msg.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+            
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="📊 Мои мониторинги", callback_data="my_monitorings")],
+                [InlineKeyboardButton(text="🤖 Автобронирование", callback_data="auto_booking")],
+                [InlineKeyboardButton(text="👥 Аккаунты", callback_data="view_accounts")],
+                [InlineKeyboardButton(text="🏪 Обновить список складов", callback_data="update_warehouses")],
+                [InlineKeyboardButton(text="🗑 Удалить токен", callback_data="remove_token")],
+                [InlineKeyboardButton(text="➕ Добавить новый токен", callback_data="add_token")]
+            ])
+            
+            await processing_msg.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
     
     except WildberriesAPIError as e:
         error_text = str(e)
@@ -511,8 +510,7 @@ async def update_warehouses(callback: CallbackQuery):
                 return
             
             # Получаем склады из API
-            async with wb_api:
-                api_warehouses = await wb_api.get_warehouses(wb_token)
+            api_warehouses = await wb_api.get_warehouses(wb_token)
             
             if not api_warehouses:
                 await callback.message.edit_text(
@@ -627,7 +625,7 @@ async def callback_auto_booking(callback: CallbackQuery, state: FSMContext):
                 return
             
             # Получаем список заказов со статусом "не запланировано"
-            wb_auth = get_wb_auth_service(user_id=user_id)
+            wb_auth = await get_wb_auth_service(user_id=user_id)
             try:
                 order_numbers = await wb_auth.get_unplanned_order_numbers(session_data)
                 
@@ -10,12 +10,17 @@ from app.config.settings import settings
 from app.config.logging import setup_logging
 from app.database.database import init_database, AsyncSessionLocal
 from app.database.repositories.slot_monitoring_repo import SlotMonitoringRepository
+from app.database.repositories.user_repo import UserRepository
 from app.database.models import MonitoringStatus
 from app.bot.handlers.auth import auth_router
 from app.bot.handlers.cabinet import cabinet_router
 from app.bot.handlers.monitoring import monitoring_router
 from app.services.slot_monitor import get_slot_monitor_service
 from app.services.session_manager import session_manager
+from app.services.wb_web_pool import wb_driver_pool
+from app.services.wildberries_api import wb_api
+from app.services.wb_web_auth import resolve_profile_dir, initialize_profile_template
+from app.utils.http_client import close_shared_connector
 
 
 async def clear_all_active_monitorings():
@@ -75,6 +80,31 @@ async def clear_all_active_monitorings():
         return None
 
 
+async def prewarm_browsers():
+    """Подготовить шаблон профиля и заранее запустить браузеры для недавних пользователей"""
+    try:
+        # Готовим шаблон профиля, из которого клонируются профили новых пользователей
+        await initialize_profile_template()
+        
+        if settings.WB_PREWARM_COUNT <= 0:
+            return
+        
+        async with AsyncSessionLocal() as session:
+            user_repo = UserRepository(session)
+            users = await user_repo.get_recent_phone_auth_users(settings.WB_PREWARM_COUNT)
+        
+        if not users:
+            return
+        
+        logger.info(f"🔥 Prewarming {len(users)} browsers for recent users")
+        profile_dirs = [await resolve_profile_dir(user.telegram_id) for user in users]
+        await wb_driver_pool.prewarm(profile_dirs)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error prewarming browsers: {e}")
+
+
 async def notify_users_about_cleared_monitorings(bot, user_monitorings: dict):
     """Уведомить пользователей об остановленных мониторингах"""
     try:
@@ -158,6 +188,9 @@ async def main():
         # Запускаем периодическую очистку сессий
         session_cleanup_task = asyncio.create_task(periodic_session_cleanup())
         
+        # Прогреваем браузеры в фоне, не задерживая запуск бота
+        prewarm_task = asyncio.create_task(prewarm_browsers())
+        
         # Запускаем бота
         logger.info("Bot started successfully")
         await dp.start_polling(bot)
@@ -176,6 +209,21 @@ async def main():
             except asyncio.CancelledError:
                 pass
         
+        # Останавливаем прогрев браузеров
+        if 'prewarm_task' in locals():
+            prewarm_task.cancel()
+            try:
+                await prewarm_task
+            except asyncio.CancelledError:
+                pass
+        
+        # Закрываем браузеры из пула
+        await wb_driver_pool.close_all()
+        
+        # Закрываем HTTP-сессию Wildberries API и общий пул соединений
+        await wb_api.aclose()
+        await close_shared_connector()
+        
         await bot.session.close()
 
 
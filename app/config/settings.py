@@ -46,6 +46,12 @@ class Settings(BaseSettings):
     
     # Браузер
     WB_BROWSER_PROFILES_DIR: str = Field("~/.wb_bot_browser_profiles", description="Директория для профилей браузера")
+    WB_MAX_BROWSERS: int = Field(10, description="Максимальное количество одновременно запущенных браузеров")
+    WB_BROWSER_IDLE_TTL: float = Field(600.0, description="Время простоя браузера в пуле до закрытия (секунды)")
+    WB_BROWSER_ACQUIRE_TIMEOUT: float = Field(60.0, description="Максимальное ожидание свободного браузера в пуле (секунды)")
+    WB_BROWSER_MAX_CHECKOUT: float = Field(1800.0, description="Время, после которого не возвращенный в пул браузер закрывается (секунды)")
+    WB_PREWARM_COUNT: int = Field(3, description="Количество браузеров, запускаемых заранее при старте бота")
+    WB_LOG_NETWORK: bool = Field(False, description="Логировать сетевые запросы браузера к Wildberries")
     
     # Логирование
     LOG_LEVEL: str = Field("INFO", description="Уровень логирования")
@@ -1,16 +1,25 @@
 """Подключение к базе данных"""
 
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from loguru import logger
 
 from app.config.settings import settings
 from app.database.models import Base
 
+
+def _json_serializer(obj) -> str:
+    """Сериализовать JSON-колонки через orjson (драйвер ожидает строку)"""
+    return orjson.dumps(obj).decode('utf-8')
+
+
 # Создаем асинхронный движок базы данных
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DB_ECHO,
-    future=True
+    future=True,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads
 )
 
 # Создаем фабрику сессий
@@ -4,7 +4,7 @@ import json
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from loguru import logger
 
 from app.database.models import User
@@ -211,6 +211,35 @@ class UserRepository:
             logger.error(f"Error removing phone auth for user {user.telegram_id}: {e}")
             raise
     
+    async def bulk_remove_phone_auth(self, telegram_ids: List[int]) -> int:
+        """Удалить данные авторизации по телефону у нескольких пользователей одним запросом"""
+        if not telegram_ids:
+            return 0
+        
+        try:
+            result = await self.session.execute(
+                update(User)
+                .where(User.telegram_id.in_(telegram_ids))
+                .values(
+                    phone_number=None,
+                    encrypted_wb_session=None,
+                    wb_inn=None,
+                    wb_seller_name=None,
+                    phone_auth_created_at=None,
+                    phone_auth_last_used_at=None,
+                    updated_at=datetime.utcnow()
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+            logger.info(f"Removed phone auth for {result.rowcount} users")
+            return result.rowcount
+            
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Error bulk removing phone auth: {e}")
+            raise
+    
     async def get_phone_auth_info(self, user: User) -> Optional[Dict[str, Any]]:
         """Получить информацию об авторизации по телефону (без сессии)"""
         try:
@@ -240,6 +269,20 @@ class UserRepository:
             logger.error(f"Error getting all users: {e}")
             return []
 
+    async def get_recent_phone_auth_users(self, limit: int) -> List[User]:
+        """Получить пользователей с авторизацией по телефону, недавно использовавших сессию"""
+        try:
+            result = await self.session.execute(
+                select(User)
+                .where(User.encrypted_wb_session.isnot(None))
+                .order_by(User.phone_auth_last_used_at.desc().nullslast())
+                .limit(limit)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error getting recent phone auth users: {e}")
+            return []
+
     async def delete_user(self, telegram_id: int) -> bool:
         """Удалить пользователя по Telegram ID (каскадное удаление)"""
         try:
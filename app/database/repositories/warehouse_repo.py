@@ -1,7 +1,7 @@
 """Репозиторий для работы со складами"""
 
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 from loguru import logger
@@ -26,6 +26,13 @@ class WarehouseRepository:
             logger.error(f"Error getting all warehouses: {e}")
             return []
 
+    async def stream_all_warehouses(self, batch_size: int = 500) -> AsyncIterator[Warehouse]:
+        """Построчно получить все активные склады, не загружая весь результат в память"""
+        stmt = select(Warehouse).where(Warehouse.is_active == True).execution_options(yield_per=batch_size)
+        result = await self.session.stream_scalars(stmt)
+        async for warehouse in result:
+            yield warehouse
+
     async def get_warehouse_by_wb_id(self, wb_warehouse_id: int) -> Optional[Warehouse]:
         """Получить склад по WB ID"""
         try:
@@ -11,8 +11,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
 from loguru import logger
 
-from app.services.wb_web_auth import WBWebAuthService, WBWebAuthError
-from app.utils.browser_config import create_undetectable_chrome_options, setup_undetectable_chrome
+from app.services.wb_web_auth import WBWebAuthService, WBWebAuthError, STORAGE_RESTORE_SCRIPT
 
 
 class BookingServiceError(Exception):
@@ -31,51 +30,16 @@ class BookingService:
     async def _ensure_browser_ready(self):
         """Убедиться, что браузер готов к работе"""
         if not self.driver:
-            # Сначала пытаемся использовать существующий браузер из сервиса авторизации
-            if self.wb_auth_service.driver:
-                logger.info("Using existing browser from auth service for booking...")
-                self.driver = self.wb_auth_service.driver
-                self.wait = self.wb_auth_service.wait
-            else:
-                logger.info("No existing browser found, initializing new one for booking...")
-                await self._initialize_browser()
-    
-    async def _initialize_browser(self):
-        """Инициализировать браузер для бронирования"""
-        try:
-            # Персистентный профиль браузера для сохранения сессии
-            import os
-            import tempfile
-            import uuid
-            profile_dir = os.path.join(tempfile.gettempdir(), f'wb_bot_booking_profile_{uuid.uuid4().hex[:8]}')
-            
-            # Создаем настройки браузера с защитой от детекции
-            options = create_undetectable_chrome_options(profile_dir=profile_dir)
-            
-            # Запускаем браузер
-            self.driver = webdriver.Chrome(options=options)
-            self.wait = WebDriverWait(self.driver, 15)  # Увеличиваем время ожидания для бронирования
-            
-            # Настраиваем защиту от детекции
-            setup_undetectable_chrome(self.driver)
-            
-            logger.info("Booking browser initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Error initializing booking browser: {e}")
-            await self._cleanup()
-            raise
+            # Используем браузер пользователя из пула через сервис авторизации:
+            # его профиль уже содержит сессию, а запуск Chrome при повторном бронировании не нужен
+            await self.wb_auth_service._ensure_browser_ready()
+            logger.info("Using browser from auth service for booking...")
+            self.driver = self.wb_auth_service.driver
+            self.wait = self.wb_auth_service.wait
     
     async def _cleanup(self):
         """Очистить ресурсы браузера"""
-        try:
-            # Не закрываем браузер, если он используется из сервиса авторизации
-            if self.driver and self.driver != self.wb_auth_service.driver:
-                self.driver.quit()
-        except:
-            pass
-        
-        # Сбрасываем ссылки на драйвер, но не закрываем его
+        # Браузер принадлежит пулу: сбрасываем ссылки на драйвер, но не закрываем его
         self.driver = None
         self.wait = None
     
@@ -98,6 +62,22 @@ class BookingService:
         Returns:
             Tuple[bool, str]: (успех, сообщение)
         """
+        # Браузер берется из пула на время бронирования и затем возвращается в него;
+        # блокировка сервиса авторизации не дает двум операциям делить одну вкладку
+        try:
+            async with self.wb_auth_service.browser_session():
+                return await self._book_slot(session_data, order_number, target_date, target_warehouse_id)
+        finally:
+            # Браузер вернулся в пул и может быть закрыт им: следующее бронирование возьмет его заново
+            await self._cleanup()
+    
+    async def _book_slot(
+        self, 
+        session_data: Dict[str, Any], 
+        order_number: str, 
+        target_date: datetime,
+        target_warehouse_id: int
+    ) -> Tuple[bool, str]:
         try:
             logger.info(f"Starting booking process for order {order_number}, date {target_date.date()}, warehouse {target_warehouse_id}")
             
@@ -136,8 +116,6 @@ class BookingService:
         except Exception as e:
             logger.error(f"Error booking slot for order {order_number}: {e}")
             raise BookingServiceError(f"Ошибка бронирования: {str(e)}")
-        finally:
-            await self._cleanup()
     
     async def _restore_session(self, session_data: Dict[str, Any]):
         """Восстановить сессию пользователя или проверить существующую"""
@@ -165,7 +143,8 @@ class BookingService:
                     logger.info("🔑 Browser not authorized, restoring session...")
                     await self._restore_session_data(session_data)
                 else:
-                    # Готовы к прямому переходу на страницу деталей поставки
+                    # Браузер только что взят из пула: устанавливаем cookies сессии до перехода
+                    await self.wb_auth_service._restore_cookies_only(session_data)
                     logger.info("🌐 Ready for direct navigation to supply detail page")
             else:
                 # Если используем новый браузер, восстанавливаем сессию
@@ -206,20 +185,15 @@ class BookingService:
             
             logger.info(f"🔑 Successfully restored {restored_count} cookies")
             
-            # Восстанавливаем localStorage и sessionStorage
-            if 'local_storage' in session_data:
+            # Восстанавливаем localStorage и sessionStorage одним скриптом;
+            # значения передаются аргументами, поэтому кавычки в них не ломают скрипт
+            local_storage = session_data.get('local_storage') or {}
+            session_storage = session_data.get('session_storage') or {}
+            if local_storage or session_storage:
                 try:
-                    for key, value in session_data['local_storage'].items():
-                        self.driver.execute_script(f"localStorage.setItem('{key}', '{value}');")
+                    self.driver.execute_script(STORAGE_RESTORE_SCRIPT, local_storage, session_storage)
                 except Exception as e:
-                    logger.debug(f"Could not restore localStorage: {e}")
-            
-            if 'session_storage' in session_data:
-                try:
-                    for key, value in session_data['session_storage'].items():
-                        self.driver.execute_script(f"sessionStorage.setItem('{key}', '{value}');")
-                except Exception as e:
-                    logger.debug(f"Could not restore sessionStorage: {e}")
+                    logger.debug(f"Could not restore storage: {e}")
             
             # Перезагружаем страницу с восстановленными cookies
             logger.info("🔄 Refreshing page with restored session")
@@ -703,15 +677,6 @@ class BookingService:
         except Exception as e:
             logger.error(f"Unexpected error in _confirm_booking: {e}")
             raise BookingServiceError(f"Неожиданная ошибка при подтверждении бронирования: {e}")
-    
-    async def __aenter__(self):
-        """Async context manager entry"""
-        await self._initialize_browser()
-        return self
-        
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit"""
-        await self._cleanup()
 
 
 # Глобальный экземпляр сервиса бронирования
@@ -9,6 +9,7 @@ from loguru import logger
 from app.config.settings import settings
 from app.services.wildberries_api import wb_api, WildberriesAPIError
 from app.services.booking_service import get_booking_service, BookingService, BookingServiceError
+from app.services.wb_web_auth import get_wb_auth_service
 from app.database.database import AsyncSessionLocal
 from app.database.repositories.user_repo import UserRepository
 from app.database.repositories.slot_monitoring_repo import SlotMonitoringRepository
@@ -220,23 +221,22 @@ class SlotMonitorService:
             logger.debug(
                 f"Checking slots for monitoring {monitoring.id}: warehouses={monitoring.warehouse_ids}")
 
-            async with wb_api:
-                # Получаем коэффициенты приемки для выбранных складов
-                coefficients = await wb_api.get_acceptance_coefficients(
-                    api_token=wb_token,
-                    warehouse_ids=monitoring.warehouse_ids
-                )
+            # Получаем коэффициенты приемки для выбранных складов
+            coefficients = await wb_api.get_acceptance_coefficients(
+                api_token=wb_token,
+                warehouse_ids=monitoring.warehouse_ids
+            )
 
-                logger.debug(
-                    f"Received {len(coefficients)} coefficients for monitoring {monitoring.id}")
+            logger.debug(
+                f"Received {len(coefficients)} coefficients for monitoring {monitoring.id}")
 
-                # Фильтруем коэффициенты по критериям мониторинга
-                suitable_slots = self._filter_suitable_coefficients(
-                    coefficients, monitoring)
+            # Фильтруем коэффициенты по критериям мониторинга
+            suitable_slots = self._filter_suitable_coefficients(
+                coefficients, monitoring)
 
-                # Обрабатываем слоты по складам
-                if suitable_slots:
-                    await self._process_slots_by_warehouse(monitoring, suitable_slots)
+            # Обрабатываем слоты по складам
+            if suitable_slots:
+                await self._process_slots_by_warehouse(monitoring, suitable_slots)
 
         except WildberriesAPIError as e:
             error_message = str(e)
@@ -598,6 +598,12 @@ class SlotMonitorService:
         slot_info: Dict[str, Any]
     ):
         """Отправить уведомление о найденном слоте и автоматически забронировать его"""
+        # Запоминаем chat_id заранее: обращение к monitoring.user внутри except
+        # может само упасть (detached instance) и скрыть исходную ошибку
+        tg_id = monitoring.user.telegram_id
+        # Дата форматируется один раз для всех вариантов сообщения
+        slot_date_str = slot_date.strftime('%d.%m.%Y')
+
         try:
             # Формируем текст уведомления
             coeff_text = "🟢 Бесплатная приемка" if coefficient == 0 else "🟡 Платная приемка"
@@ -612,7 +618,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 💰 <b>Коэффициент:</b> {coefficient} ({coeff_text})
 📦 <b>Тип упаковки:</b> {box_type_name} (ID: {box_type_id})
 
@@ -621,7 +627,7 @@ class SlotMonitorService:
 
             # Отправляем начальное уведомление
             initial_message = await self.bot.send_message(
-                chat_id=monitoring.user.telegram_id,
+                chat_id=tg_id,
                 text=initial_notification_text,
                 parse_mode="HTML"
             )
@@ -640,7 +646,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 
 <b>💬 Причина:</b> Сессия не найдена. Необходимо авторизоваться в кабинете Wildberries.
 
@@ -661,7 +667,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 
 <b>💬 Причина:</b> Номер заказа не найден в мониторинге.
                 """
@@ -690,7 +696,7 @@ class SlotMonitorService:
             # Отправляем уведомление об ошибке, если не удалось даже отправить сообщение
             try:
                 await self.bot.send_message(
-                    chat_id=monitoring.user.telegram_id,
+                    chat_id=tg_id,
                     text=f"❌ <b>Ошибка автобронирования</b>\n\n💬 {str(e).replace('<', '&lt;').replace('>', '&gt;')}",
                     parse_mode="HTML"
                 )
@@ -710,6 +716,8 @@ class SlotMonitorService:
     ):
         """Попытка бронирования с повторными попытками при ошибках"""
         max_attempts = 3
+        tg_id = monitoring.user.telegram_id
+        slot_date_str = slot_date.strftime('%d.%m.%Y')
         attempt = self.booking_attempts_cache.get(monitoring.id, 0) + 1
         
         # Обновляем счетчик попыток
@@ -718,11 +726,9 @@ class SlotMonitorService:
         logger.info(f"🔄 Booking attempt {attempt}/{max_attempts} for monitoring {monitoring.id}")
         
         try:
-            from app.services.wb_web_auth import get_wb_auth_service
-            from app.services.booking_service import BookingService, BookingServiceError
-            
-            auth_service = get_wb_auth_service(user_id=monitoring.user.telegram_id)
-            booking_service = BookingService(auth_service)
+            # Сервис бронирования легкий: браузер пользователя переиспользуется через пул,
+            # а параллельные бронирования одного пользователя выполняются по очереди
+            booking_service = BookingService(await get_wb_auth_service(user_id=tg_id))
             
             success, message = await booking_service.book_slot(
                 session_data=session_data,
@@ -738,7 +744,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 📦 <b>Заказ:</b> {monitoring.order_number}
 💰 <b>Коэффициент:</b> {coefficient} ({coeff_text})
 
@@ -766,7 +772,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 📦 <b>Заказ:</b> {monitoring.order_number}
 
 <b>💬 {message}</b>
@@ -810,7 +816,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 📦 <b>Заказ:</b> {monitoring.order_number}
 
 <b>💬 Попытка {attempt + 1}/{max_attempts}</b>
@@ -848,7 +854,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 📦 <b>Заказ:</b> {monitoring.order_number}
 
 <b>💬 Попыток: {attempt}/{max_attempts}</b>
@@ -862,7 +868,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 📦 <b>Заказ:</b> {monitoring.order_number}
 
 <b>💬 {error_message.replace('<', '&lt;').replace('>', '&gt;')}</b>
@@ -892,7 +898,7 @@ class SlotMonitorService:
 
 <b>📊 Мониторинг #{monitoring.id}</b>
 🏪 <b>Склад:</b> {warehouse_name} (ID: {warehouse_id})
-📅 <b>Дата:</b> {slot_date.strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {slot_date_str}
 📦 <b>Заказ:</b> {monitoring.order_number}
 
 <b>💬 Попробуйте позже или обратитесь в поддержку.</b>
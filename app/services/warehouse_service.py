@@ -1,6 +1,6 @@
 """Сервис для работы со складами"""
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
@@ -15,25 +15,30 @@ class WarehouseService:
         self.session = session
         self.warehouse_repo = WarehouseRepository(session)
     
+    @staticmethod
+    def _warehouse_to_dict(warehouse) -> Dict[str, Any]:
+        """Преобразовать склад в формат, совместимый с API"""
+        return {
+            'ID': warehouse.wb_warehouse_id,
+            'id': warehouse.wb_warehouse_id,
+            'Name': warehouse.name,
+            'name': warehouse.name,
+            'Address': warehouse.address,
+            'address': warehouse.address,
+            'accepts_fbs': warehouse.accepts_fbs,
+            'accepts_fbo': warehouse.accepts_fbo,
+            'warehouse_info': warehouse.warehouse_info if warehouse.warehouse_info is not None else {}
+        }
+    
+    async def iter_cached_warehouses(self) -> AsyncIterator[Dict[str, Any]]:
+        """Построчно получить кэшированные склады из базы данных"""
+        async for warehouse in self.warehouse_repo.stream_all_warehouses():
+            yield self._warehouse_to_dict(warehouse)
+    
     async def get_cached_warehouses(self) -> List[Dict[str, Any]]:
         """Получить кэшированные склады из базы данных"""
         try:
-            warehouses = await self.warehouse_repo.get_all_warehouses()
-            
-            # Преобразуем в формат, совместимый с API
-            result = []
-            for warehouse in warehouses:
-                result.append({
-                    'ID': warehouse.wb_warehouse_id,
-                    'id': warehouse.wb_warehouse_id,
-                    'Name': warehouse.name,
-                    'name': warehouse.name,
-                    'Address': warehouse.address,
-                    'address': warehouse.address,
-                    'accepts_fbs': warehouse.accepts_fbs,
-                    'accepts_fbo': warehouse.accepts_fbo,
-                    'warehouse_info': warehouse.warehouse_info or {}
-                })
+            result = [warehouse async for warehouse in self.iter_cached_warehouses()]
             
             logger.info(f"Retrieved {len(result)} cached warehouses")
             return result
@@ -46,8 +51,7 @@ class WarehouseService:
         """Синхронизировать склады из API с базой данных"""
         try:
             # Получаем склады из API
-            async with wb_api:
-                api_warehouses = await wb_api.get_warehouses(api_token)
+            api_warehouses = await wb_api.get_warehouses(api_token)
             
             if not api_warehouses:
                 logger.warning("No warehouses returned from API")
@@ -78,8 +82,7 @@ class WarehouseService:
             
             # Если кэш пуст или требуется обновление, получаем из API
             logger.info("Fetching warehouses from API")
-            async with wb_api:
-                api_warehouses = await wb_api.get_warehouses(api_token)
+            api_warehouses = await wb_api.get_warehouses(api_token)
             
             if not api_warehouses:
                 logger.warning("No warehouses returned from API, trying cached data")
@@ -110,17 +113,7 @@ class WarehouseService:
             if not warehouse:
                 return None
             
-            return {
-                'ID': warehouse.wb_warehouse_id,
-                'id': warehouse.wb_warehouse_id,
-                'Name': warehouse.name,
-                'name': warehouse.name,
-                'Address': warehouse.address,
-                'address': warehouse.address,
-                'accepts_fbs': warehouse.accepts_fbs,
-                'accepts_fbo': warehouse.accepts_fbo,
-                'warehouse_info': warehouse.warehouse_info or {}
-            }
+            return self._warehouse_to_dict(warehouse)
             
         except Exception as e:
             logger.error(f"Error getting warehouse by ID {wb_warehouse_id}: {e}")
@@ -1,19 +1,264 @@
 """Сервис авторизации через веб-интерфейс Wildberries"""
 
 import asyncio
-import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import AsyncIterator, Dict, Optional, Tuple
+import aiohttp
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from loguru import logger
 
 from app.config.settings import settings
-from app.utils.browser_config import create_undetectable_chrome_options, setup_undetectable_chrome
+from app.utils.browser_config import NETWORK_LOG_READ_SCRIPT, setup_undetectable_chrome
+from app.utils.http_client import get_shared_connector
+from app.utils.constants import (
+    PHONE_INPUT_SELECTOR,
+    PHONE_SELECTORS,
+    SUBMIT_SELECTORS,
+    SMS_CODE_INPUT_SELECTOR,
+    SMS_CODE_SELECTORS,
+    SMS_SUBMIT_SELECTORS,
+    ERROR_SELECTOR,
+    INN_SELECTORS,
+    SELLER_SELECTORS,
+    USER_MARKERS_SELECTOR,
+    SUPPLIES_TABLE_BODY_SELECTOR,
+    SUPPLIES_TABLE_ROWS_SELECTOR,
+    SUPPLIES_ORDER_CELL_SELECTOR,
+    SUPPLIES_BADGE_SELECTOR,
+    SUPPLIES_CELL_SELECTOR,
+    SUPPLIES_UNPLANNED_ROWS_XPATH,
+)
+from app.services.wb_web_pool import wb_driver_pool, run_blocking, BrowserPoolTimeoutError
+
+
+# Находит поля ввода SMS кода по цепочке селекторов и, если полей несколько, заполняет
+# их по одной цифре через нативный setter value с событием input (React видит изменение).
+# Один round-trip на весь ввод кода, без пауз между цифрами
+SMS_CODE_FILL_SCRIPT = """
+const [selectors, code] = arguments;
+let inputs = [];
+for (const selector of selectors) {
+    inputs = document.querySelectorAll(selector);
+    if (inputs.length) break;
+}
+const filled = inputs.length > 1 && inputs.length >= code.length;
+if (filled) {
+    const setValue = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+    for (let i = 0; i < code.length; i++) {
+        setValue.call(inputs[i], code[i]);
+        inputs[i].dispatchEvent(new Event('input', {bubbles: true}));
+    }
+}
+return {count: inputs.length, filled: filled, first: inputs[0] || null};
+"""
+
+
+# Снимок данных сессии браузера: localStorage, sessionStorage и user agent одним запросом
+SESSION_SNAPSHOT_SCRIPT = """
+return {
+    local_storage: {...localStorage},
+    session_storage: {...sessionStorage},
+    user_agent: navigator.userAgent
+};
+"""
+
+
+# Восстанавливает localStorage и sessionStorage из переданных словарей
+STORAGE_RESTORE_SCRIPT = """
+Object.entries(arguments[0]).forEach(([k, v]) => localStorage.setItem(k, v));
+Object.entries(arguments[1]).forEach(([k, v]) => sessionStorage.setItem(k, v));
+"""
+
+
+# Базовая директория профилей браузера (вычисляется один раз при импорте)
+_PROFILES_BASE_DIR = Path(settings.WB_BROWSER_PROFILES_DIR).expanduser().resolve()
+# Заранее инициализированный пустой профиль, из которого клонируются новые профили
+PROFILE_TEMPLATE_DIR = _PROFILES_BASE_DIR / "_template"
+# Кэш уже созданных директорий профилей: user_id -> путь
+_PROFILE_CACHE: Dict[Optional[int], str] = {}
+_PROFILE_CACHE_LOCK = threading.Lock()
+# Файлы блокировки запущенного Chrome: с ними копия профиля считается занятой
+_PROFILE_LOCK_FILES = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+
+
+async def resolve_profile_dir(user_id: Optional[int]) -> str:
+    """
+    Определить (и при первом обращении создать) директорию профиля браузера.
+    
+    Создание профиля - копирование шаблона, на ФС без reflink это полная копия
+    профиля Chrome, поэтому оно выполняется в отдельном потоке, не блокируя цикл событий.
+    """
+    cached = _PROFILE_CACHE.get(user_id)
+    if cached is not None:
+        return cached
+    return await asyncio.to_thread(_create_profile_dir, user_id)
+
+
+def _create_profile_dir(user_id: Optional[int]) -> str:
+    """Создать директорию профиля (блокирующий вызов, выполняется в отдельном потоке)"""
+    with _PROFILE_CACHE_LOCK:
+        if user_id in _PROFILE_CACHE:
+            return _PROFILE_CACHE[user_id]
+
+        try:
+            _PROFILES_BASE_DIR.mkdir(parents=True, exist_ok=True)
+        except Exception as exc:
+            logger.warning(f"Could not create base browser profile dir {_PROFILES_BASE_DIR}: {exc}")
+            raise
+
+        profile_path = _PROFILES_BASE_DIR / f"wb_bot_user_{user_id or 'shared'}"
+        if not profile_path.exists() and PROFILE_TEMPLATE_DIR.is_dir():
+            _clone_profile_template(profile_path)
+        profile_path.mkdir(parents=True, exist_ok=True)
+
+        _PROFILE_CACHE[user_id] = str(profile_path)
+        return _PROFILE_CACHE[user_id]
+
+
+def _clone_profile_template(profile_path: Path):
+    """
+    Создать профиль копией шаблона, чтобы Chrome не инициализировал его с нуля.
+    
+    Используется reflink (copy-on-write на btrfs/xfs), на остальных ФС - обычная
+    копия. Жесткие ссылки не подходят: Chrome изменяет файлы профиля на месте,
+    и изменения попали бы в шаблон и профили других пользователей.
+    """
+    try:
+        subprocess.run(
+            ["cp", "-a", "--reflink=auto", f"{PROFILE_TEMPLATE_DIR}/.", str(profile_path)],
+            check=True,
+            capture_output=True
+        )
+        _remove_profile_locks(profile_path)
+        logger.info(f"Browser profile {profile_path} cloned from template")
+    except (OSError, subprocess.CalledProcessError) as exc:
+        logger.warning(f"Could not clone browser profile template: {exc}")
+
+
+def _remove_profile_locks(profile_path: Path):
+    """Удалить файлы блокировки Chrome из профиля, который не используется браузером"""
+    for name in _PROFILE_LOCK_FILES:
+        try:
+            # Это символические ссылки, часто битые, поэтому exists() не подходит
+            (profile_path / name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+async def initialize_profile_template():
+    """
+    Подготовить шаблон профиля, если его еще нет.
+    
+    Chrome создает профиль во временной директории, которая переименовывается
+    в PROFILE_TEMPLATE_DIR только после закрытия браузера: пока шаблона нет,
+    новые профили создаются с нуля и не копируют профиль работающего Chrome.
+    """
+    if PROFILE_TEMPLATE_DIR.is_dir():
+        return
+
+    logger.info("🧩 Initializing browser profile template")
+    _PROFILES_BASE_DIR.mkdir(parents=True, exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(prefix="_template_build_", dir=_PROFILES_BASE_DIR))
+    try:
+        await wb_driver_pool.initialize_profile(str(build_dir))
+        _remove_profile_locks(build_dir)
+        # rename в пределах одной ФС атомарен: шаблон появляется сразу целиком
+        os.rename(build_dir, PROFILE_TEMPLATE_DIR)
+        logger.info(f"Browser profile template created at {PROFILE_TEMPLATE_DIR}")
+    finally:
+        if build_dir.exists():
+            await asyncio.to_thread(shutil.rmtree, build_dir, ignore_errors=True)
+
+
+# Собирает ИНН и название продавца со страницы реквизитов за один round-trip.
+# ИНН берется из поля ввода, иначе - первый текстовый узел из цифр (не короче 10 символов);
+# название - первый непустой текст по селекторам в порядке приоритета
+SUPPLIER_CARD_SCAN_SCRIPT = """
+const [innSelectors, sellerSelectors] = arguments;
+let inn = null;
+for (const selector of innSelectors) {
+    const element = document.querySelector(selector);
+    if (element) {
+        if (element.value && element.value.length >= 10) inn = element.value;
+        break;
+    }
+}
+if (!inn) {
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        const text = walker.currentNode.nodeValue.trim();
+        if (text.length >= 10 && /^[0-9]+$/.test(text)) { inn = text; break; }
+    }
+}
+let name = null;
+for (const selector of sellerSelectors) {
+    const element = document.querySelector(selector);
+    const text = element ? element.innerText.trim() : '';
+    if (text) { name = text; break; }
+}
+return {inn: inn, name: name};
+"""
+
+
+# Возвращает видимый текст первого элемента ошибки или null, если ошибок нет
+ERROR_TEXT_SCRIPT = """
+const element = document.querySelector(arguments[0]);
+return element ? element.innerText.trim() : null;
+"""
+
+
+# Перебирает цепочку селекторов и возвращает первый видимый элемент
+# (опционально - только активный), одним round-trip вместо find_element на каждый промах
+FIRST_VISIBLE_SCRIPT = """
+const [selectors, enabledOnly] = arguments;
+for (const selector of selectors) {
+    for (const element of document.querySelectorAll(selector)) {
+        if (!element.getClientRects().length) continue;
+        if (enabledOnly && element.disabled) continue;
+        return element;
+    }
+}
+return null;
+"""
+
+
+# Разбирает строки таблицы поставок в браузере: [номер заказа, статус в нижнем регистре].
+# Статус берется из последнего badge строки, иначе из предпоследней ячейки
+SUPPLIES_ROWS_SCRIPT = """
+const [rowSelector, orderCellSelector, badgeSelector, cellSelector] = arguments;
+return [...document.querySelectorAll(rowSelector)].map(row => {
+    const cell = row.querySelector(orderCellSelector);
+    const badges = row.querySelectorAll(badgeSelector);
+    const cells = row.querySelectorAll(cellSelector);
+    const status = badges.length
+        ? badges[badges.length - 1].textContent
+        : (cells.length >= 2 ? cells[cells.length - 2].textContent : '');
+    return [(cell ? cell.textContent : '').trim(), (status || '').trim().toLowerCase()];
+});
+"""
+
+
+# JSON API кабинета, по ответу которого проверяется сессия без запуска браузера.
+# HTML-страницы SPA отдают 200 и без авторизации (редирект делает JavaScript),
+# а этот метод без авторизации отвечает 401 или редиректом на seller-auth
+SESSION_PROBE_URL = "https://seller.wildberries.ru/ns/suppliers/suppliers-portal-core/suppliers"
+SESSION_PROBE_PAYLOAD = [{"method": "getUserSuppliers", "params": {}, "id": "json-rpc_1", "jsonrpc": "2.0"}]
+
+
+# Частота опроса страницы при ожиданиях WebDriverWait (секунды)
+WAIT_POLL_FREQUENCY = 0.1
 
 
 class WBWebAuthError(Exception):
@@ -21,6 +266,11 @@ class WBWebAuthError(Exception):
     pass
 
 
+class WBBrowserBusyError(WBWebAuthError):
+    """Все браузеры пула заняты, операцию нужно повторить позже"""
+    pass
+
+
 class WBWebAuthService:
     """Сервис для авторизации через веб-интерфейс Wildberries"""
     
@@ -29,113 +279,153 @@ class WBWebAuthService:
         self.wait: Optional[WebDriverWait] = None
         self._phone_number: Optional[str] = None  # Сохраняем номер телефона для второго этапа
         self.user_id = user_id  # Сохраняем ID пользователя для создания уникальной директории профиля
-        self._profile_dir = self._resolve_profile_dir()
+        self._cookies_installed = False  # Cookies сессии уже установлены в текущий браузер
+        # Директория профиля создается при первом запуске браузера, а не в конструкторе
+        self._profile_dir: Optional[str] = None
+        # Операции с браузером выполняются по одной: они делят одну вкладку
+        self._operation_lock = asyncio.Lock()
+        # Браузер берется из пула одним вызовом, даже если его запросили параллельно
+        self._init_lock = asyncio.Lock()
 
-    def _resolve_profile_dir(self) -> str:
+    async def _resolve_profile_dir(self) -> str:
         """Определить (и создать) директорию профиля браузера для пользователя"""
-        base_dir = Path(settings.WB_BROWSER_PROFILES_DIR).expanduser().resolve()
-        try:
-            base_dir.mkdir(parents=True, exist_ok=True)
-        except Exception as exc:
-            logger.warning(f"Could not create base browser profile dir {base_dir}: {exc}")
-            raise
-
-        profile_path = base_dir / f"wb_bot_user_{self.user_id or 'shared'}"
-        profile_path.mkdir(parents=True, exist_ok=True)
-        return str(profile_path)
+        if self._profile_dir is None:
+            self._profile_dir = await resolve_profile_dir(self.user_id)
+        return self._profile_dir
     
     async def _ensure_browser_ready(self):
         """Убедиться, что браузер готов к работе"""
+        if self.driver and not wb_driver_pool.is_checked_out(self.driver):
+            # Пул закрыл браузер, который слишком долго не возвращали
+            logger.warning("Browser was closed by the pool, acquiring a new one")
+            self.driver = None
+            self.wait = None
+            self._cookies_installed = False
+        
         if not self.driver:
             logger.info("Browser not ready, initializing...")
             await self._initialize_browser()
     
     async def _initialize_browser(self):
         """Инициализировать браузер"""
-        try:
+        # Без блокировки два параллельных вызова взяли бы из пула два браузера
+        # с одним профилем, и ошибка второго вернула бы в пул браузер первого
+        async with self._init_lock:
             if self.driver:
                 return
-
-            # Создаем настройки браузера с защитой от детекции
-            options = create_undetectable_chrome_options(profile_dir=self._profile_dir)
-            
-            # Запускаем браузер с дополнительными настройками для работы под root
-            from selenium.webdriver.chrome.service import Service
             
+            driver = None
             try:
-                # Пытаемся запустить браузер стандартным способом
-                self.driver = webdriver.Chrome(options=options)
-                logger.info("Browser started successfully with default Chrome")
+                # Берем браузер из пула вместо запуска нового Chrome
+                driver = await wb_driver_pool.acquire(await self._resolve_profile_dir())
+                
+                # Настраиваем защиту от детекции (один раз на браузер)
+                if not getattr(driver, '_undetect_applied', False):
+                    await run_blocking(setup_undetectable_chrome, driver)
+                    driver._undetect_applied = True
+                
+                self.driver = driver
+                # Увеличиваем время ожидания для стабильности, опрашиваем страницу часто
+                self.wait = WebDriverWait(driver, 15, poll_frequency=WAIT_POLL_FREQUENCY)
+                
+                logger.info("Browser initialized successfully")
+                
+            except BrowserPoolTimeoutError as e:
+                logger.error(f"Error initializing browser: {e}")
+                raise WBBrowserBusyError("Все браузеры заняты, попробуйте позже") from e
             except Exception as e:
-                logger.warning(f"Could not start Chrome with default method: {e}")
-                try:
-                    # Пробуем указать явно путь к chromium для Linux-систем
-                    options.binary_location = "/usr/bin/chromium"
-                    self.driver = webdriver.Chrome(options=options)
-                    logger.info("Browser started using explicit chromium path")
-                except Exception as e2:
-                    logger.error(f"Failed to start Chrome with explicit path: {e2}")
-                    # Последняя попытка - использовать chromium-browser
-                    try:
-                        options.binary_location = "/usr/bin/chromium-browser"
-                        self.driver = webdriver.Chrome(options=options)
-                        logger.info("Browser started using chromium-browser path")
-                    except Exception as e3:
-                        logger.error(f"All browser initialization methods failed: {e3}")
-                        raise
-            
-            # Увеличиваем время ожидания для стабильности
-            self.wait = WebDriverWait(self.driver, 15)
-            
-            # Настраиваем защиту от детекции
-            setup_undetectable_chrome(self.driver)
-            
-            logger.info("Browser initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Error initializing browser: {e}")
-            await self._cleanup()
-            raise
+                logger.error(f"Error initializing browser: {e}")
+                # Возвращаем в пул только браузер, взятый этим вызовом
+                await wb_driver_pool.release(driver)
+                raise
     
-    async def _cleanup(self):
-        """Очистить ресурсы браузера"""
+    async def _current_url(self) -> str:
+        """Получить текущий URL браузера, не блокируя цикл событий"""
+        return await run_blocking(lambda: self.driver.current_url or "")
+    
+    def _wait_until(self, condition, timeout: float = 15):
+        """Дождаться выполнения условия с частым опросом страницы"""
+        return WebDriverWait(self.driver, timeout, poll_frequency=WAIT_POLL_FREQUENCY).until(condition)
+    
+    def _first_visible(self, selectors, enabled_only: bool = False) -> Optional[WebElement]:
+        """Найти первый видимый элемент по цепочке селекторов за один запрос к браузеру"""
+        return self.driver.execute_script(FIRST_VISIBLE_SCRIPT, list(selectors), enabled_only)
+    
+    def _get_error_text(self) -> Optional[str]:
+        """Получить текст первого сообщения об ошибке на странице одним запросом"""
+        return self.driver.execute_script(ERROR_TEXT_SCRIPT, ERROR_SELECTOR)
+    
+    def _wait_for_page_load(self, timeout: float = 15):
+        """Дождаться полной загрузки документа вместо фиксированной паузы"""
+        try:
+            self._wait_until(
+                lambda driver: driver.execute_script("return document.readyState") == "complete",
+                timeout
+            )
+        except TimeoutException:
+            logger.debug("Timeout waiting for document.readyState == complete")
+    
+    async def _release_browser(self):
+        """Вернуть браузер в пул, сохранив состояние авторизации по телефону"""
         try:
             if self.driver:
-                self.driver.quit()
+                await wb_driver_pool.release(self.driver)
         except:
             pass
         
         self.driver = None
         self.wait = None
+        self._cookies_installed = False
+    
+    async def _cleanup(self):
+        """Вернуть браузер в пул и сбросить состояние"""
+        await self._release_browser()
         self._phone_number = None
     
+    @asynccontextmanager
+    async def browser_session(self, keep_browser: bool = False) -> AsyncIterator["WBWebAuthService"]:
+        """
+        Выполнить операцию с браузером под блокировкой сервиса
+        
+        Браузер, взятый из пула во время операции, по ее окончании возвращается
+        в пул, а не остается занятым на все время жизни сервиса. keep_browser
+        оставляет браузер за сервисом: шаги авторизации по SMS работают с одной страницей.
+        """
+        async with self._operation_lock:
+            had_browser = self.driver is not None
+            try:
+                yield self
+            finally:
+                if not had_browser and not keep_browser:
+                    await self._release_browser()
+    
     async def start_session(self):
         """Начать новую сессию (инициализировать браузер)"""
         await self._initialize_browser()
     
     async def close_session(self):
-        """Закрыть сессию (закрыть браузер)"""
+        """Закрыть сессию (вернуть браузер в пул)"""
         await self._cleanup()
     
     def _log_network_requests(self):
-        """Логировать сетевые запросы"""
+        """
+        Логировать сетевые запросы (только при включенном WB_LOG_NETWORK).
+        
+        Ответы Wildberries собирает скрипт, встроенный в страницу при настройке
+        браузера; буфер ограничен NETWORK_LOG_MAX_ENTRIES записями и очищается
+        при чтении, поэтому метод вызывается один раз в конце операции.
+        """
+        if not settings.WB_LOG_NETWORK:
+            return
+        
         try:
-            # Получаем логи сетевых запросов
-            logs = self.driver.get_log('performance')
-            for log in logs:
-                message = json.loads(log['message'])
-                if message['message']['method'] == 'Network.responseReceived':
-                    response = message['message']['params']['response']
-                    url = response['url']
-                    status = response['status']
-                    method = response.get('method', 'GET')
-                    
-                    # Логируем только запросы к Wildberries
-                    if 'wildberries.ru' in url:
-                        if status == 200:
-                            logger.info(f"🌐 {method} {url} → {status}")
-                        else:
-                            logger.warning(f"🌐 {method} {url} → {status}")
+            responses = self.driver.execute_script(NETWORK_LOG_READ_SCRIPT) or []
+            for response in responses:
+                method = response.get('method', 'GET')
+                if response['status'] == 200:
+                    logger.info(f"🌐 {method} {response['url']} → {response['status']}")
+                else:
+                    logger.warning(f"🌐 {method} {response['url']} → {response['status']}")
         except Exception as e:
             logger.debug(f"Could not log network requests: {e}")
         
@@ -150,6 +440,11 @@ class WBWebAuthService:
     
     async def request_sms_code(self, phone_number: str) -> bool:
         """Запросить SMS код для номера телефона"""
+        # Браузер остается за сервисом до ввода кода
+        async with self.browser_session(keep_browser=True):
+            return await self._request_sms_code(phone_number)
+    
+    async def _request_sms_code(self, phone_number: str) -> bool:
         try:
             logger.info(f"Requesting SMS code for phone: {phone_number}")
             
@@ -158,92 +453,53 @@ class WBWebAuthService:
             
             # Переходим на страницу входа
             logger.info("🌐 Navigating to: https://seller-auth.wildberries.ru/ru/")
-            self.driver.get("https://seller-auth.wildberries.ru/ru/")
-            await asyncio.sleep(3)  # Даем время на загрузку
-            
-            # Логируем сетевые запросы
-            self._log_network_requests()
+            await run_blocking(self.driver.get, "https://seller-auth.wildberries.ru/ru/")
+            await run_blocking(self._wait_for_page_load)
             
             # Сохраняем скриншот для отладки
             try:
-                self.driver.save_screenshot("debug_phone_page.png")
+                await run_blocking(self.driver.save_screenshot, "debug_phone_page.png")
                 logger.info("Screenshot saved: debug_phone_page.png")
             except:
                 pass
             
             # Ждем появления поля для ввода телефона
             try:
-                phone_input = self.wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, 'input[data-testid="phone-input"]'))
+                phone_input = await run_blocking(
+                    self.wait.until,
+                    EC.presence_of_element_located((By.CSS_SELECTOR, PHONE_INPUT_SELECTOR))
                 )
                 logger.info("Phone input field found")
             except TimeoutException:
                 logger.error("Phone input not found with primary selector")
                 # Попробуем найти альтернативные селекторы
-                alternative_selectors = [
-                    'input[type="text"]',
-                    'input[placeholder*="999"]',
-                    'input[inputmode="numeric"]'
-                ]
-                
-                phone_input = None
-                for selector in alternative_selectors:
-                    try:
-                        phone_input = self.driver.find_element(By.CSS_SELECTOR, selector)
-                        if phone_input:
-                            logger.info(f"Found phone input with selector: {selector}")
-                            break
-                    except:
-                        continue
+                phone_input = await run_blocking(self._first_visible, PHONE_SELECTORS)
                 
                 if not phone_input:
                     raise WBWebAuthError("Не найдено поле для ввода номера телефона")
             
             # Очищаем поле и вводим номер (только цифры без +7)
-            phone_input.click()  # Кликаем на поле
-            await asyncio.sleep(0.5)
-            phone_input.clear()  # Очищаем поле
-            await asyncio.sleep(0.5)
+            await run_blocking(phone_input.click)  # Кликаем на поле
+            await run_blocking(phone_input.clear)  # Очищаем поле
             
             # Убираем +7 из номера, так как код страны уже выбран
             phone_digits = phone_number[2:] if phone_number.startswith('+7') else phone_number
             
-            # Вводим номер по одной цифре для более реалистичного поведения
-            for digit in phone_digits:
-                phone_input.send_keys(digit)
-                await asyncio.sleep(0.1)  # Небольшая задержка между символами
-            
-            await asyncio.sleep(1)
-            
-            # Ждем, пока кнопка станет активной
-            await asyncio.sleep(1)
-            
-            # Ищем кнопку отправки
-            submit_selectors = [
-                'button[data-testid="submit-phone-button"]',
-                'button[type="submit"]'
-            ]
+            # Вводим номер одной командой: посимвольный ввод стоит round-trip на каждую цифру
+            await run_blocking(phone_input.send_keys, phone_digits)
             
-            submit_button = None
-            for selector in submit_selectors:
-                try:
-                    submit_button = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    if submit_button:
-                        # Ждем, пока кнопка станет активной (максимум 5 секунд)
-                        for _ in range(10):  # 10 попыток по 0.5 секунды
-                            is_disabled = submit_button.get_attribute('disabled')
-                            if not is_disabled:
-                                logger.info(f"Found active submit button with selector: {selector}")
-                                break
-                            await asyncio.sleep(0.5)
-                        else:
-                            logger.info(f"Submit button still disabled: {selector}")
-                            submit_button = None
-                        
-                        if submit_button:
-                            break
-                except:
-                    continue
+            # Ищем кнопку отправки и ждем, пока она станет активной (максимум 5 секунд):
+            # каждый опрос проверяет всю цепочку селекторов одним запросом
+            try:
+                submit_button = await run_blocking(
+                    self._wait_until,
+                    lambda driver: self._first_visible(SUBMIT_SELECTORS, enabled_only=True),
+                    timeout=5
+                )
+                logger.info("Found active submit button")
+            except TimeoutException:
+                logger.info("Submit button still disabled or not found")
+                submit_button = None
             
             if not submit_button:
                 raise WBWebAuthError("Не найдена активная кнопка отправки SMS кода")
@@ -252,40 +508,45 @@ class WBWebAuthService:
             try:
                 # Наводим курсор на кнопку
                 from selenium.webdriver.common.action_chains import ActionChains
-                ActionChains(self.driver).move_to_element(submit_button).perform()
-                await asyncio.sleep(0.5)
+                await run_blocking(ActionChains(self.driver).move_to_element(submit_button).perform)
                 
                 # Нажимаем кнопку
-                submit_button.click()
+                await run_blocking(submit_button.click)
                 logger.info("Submit button clicked, waiting for SMS code form...")
                 
-                # Логируем сетевые запросы после отправки
-                await asyncio.sleep(2)
-                self._log_network_requests()
-                
                 # Ждем появления формы ввода кода (до 10 секунд)
                 try:
                     # Ждем появления формы с полями для ввода кода
-                    self.wait.until(
+                    await run_blocking(
+                        self.wait.until,
                         EC.presence_of_element_located((By.CSS_SELECTOR, 'form.CodeInputContentView__form-mgPTHveibl'))
                     )
                     logger.info("SMS code form appeared")
                 except TimeoutException:
                     # Альтернативный селектор для формы
                     try:
-                        self.wait.until(
+                        await run_blocking(
+                            self.wait.until,
                             EC.presence_of_element_located((By.CSS_SELECTOR, 'ul.SimpleCodeInput-016VPGuQ+E'))
                         )
                         logger.info("SMS code input list appeared")
                     except TimeoutException:
                         # Ждем появления хотя бы одного поля для ввода кода
-                        self.wait.until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, 'input[data-testid="sms-code-input"]'))
+                        await run_blocking(
+                            self.wait.until,
+                            EC.presence_of_element_located((By.CSS_SELECTOR, SMS_CODE_INPUT_SELECTOR))
                         )
                         logger.info("SMS code input field appeared")
                 
-                # Дополнительная пауза для стабилизации
-                await asyncio.sleep(2)
+                # Ждем появления полей ввода кода внутри формы
+                try:
+                    await run_blocking(
+                        self._wait_until,
+                        EC.presence_of_element_located((By.CSS_SELECTOR, SMS_CODE_INPUT_SELECTOR)),
+                        timeout=5
+                    )
+                except TimeoutException:
+                    pass
                     
             except Exception as e:
                 if "Timeout" in str(e):
@@ -293,12 +554,11 @@ class WBWebAuthService:
                 raise
             
             # Проверяем, что форма кода действительно появилась
-            code_inputs = self.driver.find_elements(By.CSS_SELECTOR, 'input[data-testid="sms-code-input"]')
+            code_inputs = await run_blocking(self.driver.find_elements, By.CSS_SELECTOR, SMS_CODE_INPUT_SELECTOR)
             if not code_inputs:
                 # Проверяем, не появилась ли ошибка
-                error_elements = self.driver.find_elements(By.CSS_SELECTOR, '.error, .alert, [class*="error"]')
-                if error_elements:
-                    error_text = error_elements[0].text
+                error_text = await run_blocking(self._get_error_text)
+                if error_text is not None:
                     raise WBWebAuthError(f"Ошибка при запросе SMS: {error_text}")
                 
                 raise WBWebAuthError("Не найдено поле для ввода SMS кода")
@@ -320,90 +580,77 @@ class WBWebAuthService:
                 raise WBWebAuthError("Превышено время ожидания. Попробуйте еще раз.")
             else:
                 raise WBWebAuthError(f"Ошибка запроса SMS кода: {error_msg}")
+        finally:
+            # Логируем сетевые запросы за всю операцию одним чтением буфера
+            await run_blocking(self._log_network_requests)
     
     async def verify_sms_code(self, sms_code: str) -> Tuple[bool, Optional[Dict]]:
         """Проверить SMS код и получить данные сессии"""
+        async with self.browser_session(keep_browser=True):
+            return await self._verify_sms_code(sms_code)
+    
+    async def _verify_sms_code(self, sms_code: str) -> Tuple[bool, Optional[Dict]]:
         try:
             logger.info("Verifying SMS code...")
             
             # Убеждаемся, что браузер готов
             await self._ensure_browser_ready()
             
-            # Ищем поля для ввода кода
-            code_inputs = self.driver.find_elements(By.CSS_SELECTOR, 'input[data-testid="sms-code-input"]')
-            
-            if not code_inputs:
-                # Попробуем альтернативные селекторы
-                code_selectors = [
-                    'input[type="text"]',
-                    'input[name="code"]',
-                    'input[placeholder*="код"]',
-                    'input[placeholder*="code"]'
-                ]
-                
-                for selector in code_selectors:
-                    code_inputs = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                    if code_inputs:
-                        break
+            # Ищем поля для ввода кода и заполняем их (6 отдельных полей) одним запросом
+            code_entry = await run_blocking(
+                self.driver.execute_script,
+                SMS_CODE_FILL_SCRIPT, [SMS_CODE_INPUT_SELECTOR, *SMS_CODE_SELECTORS], sms_code
+            )
             
-            if not code_inputs:
+            if not code_entry['count']:
                 raise WBWebAuthError("Не найдено поле для ввода SMS кода")
             
-            # Вводим SMS код (6 отдельных полей)
-            logger.info(f"Found {len(code_inputs)} code input fields")
+            logger.info(f"Found {code_entry['count']} code input fields")
             
-            if len(code_inputs) >= len(sms_code):
-                for i, digit in enumerate(sms_code):
-                    if i < len(code_inputs):
-                        code_inputs[i].clear()  # Очищаем поле
-                        code_inputs[i].send_keys(digit)
-                        await asyncio.sleep(0.3)  # Задержка между вводами
-                        logger.info(f"Entered digit {digit} in field {i+1}")
+            if code_entry['filled']:
+                logger.info(f"Entered code into {len(sms_code)} fields")
             else:
                 # Если не нашли отдельные поля, пробуем ввести в первое поле
-                code_inputs[0].clear()  # Очищаем поле
-                code_inputs[0].send_keys(sms_code)
+                code_input = code_entry['first']
+                await run_blocking(code_input.clear)  # Очищаем поле
+                await run_blocking(code_input.send_keys, sms_code)
                 logger.info(f"Entered full code {sms_code} in single field")
             
-            await asyncio.sleep(2)  # Даем время на автоматическую отправку
+            # Даем время на автоматическую отправку: выходим сразу после перехода в кабинет
+            try:
+                await run_blocking(self._wait_until, lambda driver: 'seller.wildberries.ru' in (driver.current_url or ''), timeout=2)
+                auto_submitted = True
+            except TimeoutException:
+                auto_submitted = False
             
             # Проверяем, есть ли кнопка подтверждения (может быть автоматическая отправка)
             submit_button = None
-            submit_selectors = [
-                'button[type="submit"]',
-                '.submit-button',
-                '[data-testid="submit-button"]'
-            ]
-            
-            for selector in submit_selectors:
-                try:
-                    submit_button = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    if submit_button:
-                        logger.info(f"Found submit button: {selector}")
-                        break
-                except:
-                    continue
+            if not auto_submitted:
+                submit_button = await run_blocking(self._first_visible, SMS_SUBMIT_SELECTORS)
+                if submit_button:
+                    logger.info("Found submit button")
             
             if submit_button:
                 # Нажимаем кнопку, если она есть
-                submit_button.click()
+                await run_blocking(submit_button.click)
                 logger.info("Submit button clicked")
-                await asyncio.sleep(3)
-                
-                # Логируем сетевые запросы после отправки SMS кода
-                self._log_network_requests()
             else:
                 # Если кнопки нет, возможно форма отправляется автоматически
                 logger.info("No submit button found, waiting for automatic submission...")
-                await asyncio.sleep(3)
-                
-                # Логируем сетевые запросы
-                self._log_network_requests()
+            
+            # Ждем перехода в кабинет или появления ошибки вместо фиксированной паузы
+            try:
+                await run_blocking(
+                    self.wait.until,
+                    lambda driver: 'seller.wildberries.ru' in (driver.current_url or '')
+                    or driver.find_elements(By.CSS_SELECTOR, ERROR_SELECTOR)
+                )
+            except TimeoutException:
+                pass
             
             # Проверяем, не появилась ли ошибка
-            error_elements = self.driver.find_elements(By.CSS_SELECTOR, '.error, .alert, [class*="error"]')
-            if error_elements:
-                error_text = error_elements[0].text
+            error_text = await run_blocking(self._get_error_text)
+            if error_text is not None:
                 if error_text and "неверный" in error_text.lower():
                     raise WBWebAuthError("Неверный SMS код")
                 elif error_text:
@@ -412,22 +659,24 @@ class WBWebAuthService:
             # Ждем перехода в кабинет или появления признаков успешной авторизации
             try:
                 # Ждем перехода на страницу кабинета
-                self.wait.until(
+                await run_blocking(
+                    self.wait.until,
                     lambda driver: 'seller.wildberries.ru' in driver.current_url
                 )
             except TimeoutException:
                 # Если не дождались перехода, проверяем текущий URL
-                current_url = self.driver.current_url
+                current_url = await self._current_url()
                 if not current_url or 'seller.wildberries.ru' not in current_url:
                     raise WBWebAuthError("Не удалось войти в кабинет")
             
             # Получаем cookies и session data
-            cookies = self.driver.get_cookies()
+            cookies = await run_blocking(self.driver.get_cookies)
+            snapshot = await run_blocking(self.driver.execute_script, SESSION_SNAPSHOT_SCRIPT)
             session_data = {
                 'cookies': cookies,
-                'local_storage': self.driver.execute_script('return { ...localStorage }'),
-                'session_storage': self.driver.execute_script('return { ...sessionStorage }'),
-                'user_agent': self.driver.execute_script('return navigator.userAgent')
+                'local_storage': snapshot['local_storage'],
+                'session_storage': snapshot['session_storage'],
+                'user_agent': snapshot['user_agent']
             }
             
             # Получаем ИНН из кабинета
@@ -437,60 +686,27 @@ class WBWebAuthService:
             try:
                 # Переходим на страницу с реквизитами
                 logger.info("🌐 Navigating to: https://seller.wildberries.ru/supplier-settings/supplier-card")
-                self.driver.get("https://seller.wildberries.ru/supplier-settings/supplier-card")
-                await asyncio.sleep(2)
-                
-                # Логируем сетевые запросы
-                self._log_network_requests()
-                
-                # Ищем поле с ИНН
-                inn_selectors = [
-                    '#taxpayerCode',
-                    'input[name="taxpayerCode"]',
-                    '[data-testid="taxpayer-code"]'
-                ]
-                
-                for selector in inn_selectors:
-                    try:
-                        inn_element = self.driver.find_element(By.CSS_SELECTOR, selector)
-                        if inn_element:
-                            inn_value = inn_element.get_attribute('value')
-                            if inn_value and len(inn_value) >= 10:  # ИНН должен быть длинным
-                                break
-                    except:
-                        continue
-                
-                # Если не нашли через input, ищем в тексте
-                if not inn_value:
-                    inn_text_elements = self.driver.find_elements(By.CSS_SELECTOR, '*')
-                    for element in inn_text_elements:
-                        try:
-                            text = element.text
-                            if text and len(text) >= 10 and text.isdigit():
-                                inn_value = text
-                                break
-                        except:
-                            continue
-                
-                # Ищем название продавца
-                seller_selectors = [
-                    '[data-testid="seller-name"]',
-                    '.seller-name',
-                    'h1',
-                    'h2',
-                    '.company-name'
-                ]
+                await run_blocking(self.driver.get, "https://seller.wildberries.ru/supplier-settings/supplier-card")
+                # Ждем отрисовки реквизитов вместо фиксированной паузы
+                try:
+                    await run_blocking(
+                        self._wait_until,
+                        EC.presence_of_element_located(
+                            (By.CSS_SELECTOR, ', '.join(INN_SELECTORS))
+                        ),
+                        timeout=5
+                    )
+                except TimeoutException:
+                    logger.debug("INN field did not appear on supplier card page")
                 
-                for selector in seller_selectors:
-                    try:
-                        seller_element = self.driver.find_element(By.CSS_SELECTOR, selector)
-                        if seller_element:
-                            seller_name = seller_element.text
-                            if seller_name and len(seller_name.strip()) > 0:
-                                seller_name = seller_name.strip()
-                                break
-                    except:
-                        continue
+                # Ищем ИНН (поле ввода или текст страницы) и название продавца одним скриптом
+                supplier_card = await run_blocking(
+                    self.driver.execute_script,
+                    SUPPLIER_CARD_SCAN_SCRIPT, list(INN_SELECTORS), list(SELLER_SELECTORS)
+                )
+                inn_value = supplier_card['inn']
+                if supplier_card['name']:
+                    seller_name = supplier_card['name']
                         
             except Exception as e:
                 logger.warning(f"Could not get INN and seller name: {e}")
@@ -510,32 +726,94 @@ class WBWebAuthService:
         except Exception as e:
             logger.error(f"Error verifying SMS code: {e}")
             raise WBWebAuthError(f"Ошибка проверки SMS кода: {str(e)}")
+        finally:
+            # Логируем сетевые запросы за всю операцию одним чтением буфера
+            await run_blocking(self._log_network_requests)
+    
+    async def _probe_session_http(self, session_data: Dict) -> Optional[bool]:
+        """
+        Проверить сессию HTTP-запросом с cookies, не запуская браузер
+        
+        Returns:
+            True - API вернул данные продавца, False - явный редирект на seller-auth,
+            None - ответ неоднозначен (401/403 от антибот-защиты и т.п.), нужна проверка в браузере
+        """
+        cookies = {
+            cookie['name']: cookie['value']
+            for cookie in session_data.get('cookies') or []
+            if 'wildberries.ru' in (cookie.get('domain') or '.wildberries.ru')
+        }
+        if not cookies:
+            return None
+        
+        headers = {}
+        if session_data.get('user_agent'):
+            headers['User-Agent'] = session_data['user_agent']
+        
+        try:
+            async with aiohttp.ClientSession(
+                connector=get_shared_connector(),
+                connector_owner=False,
+                timeout=aiohttp.ClientTimeout(total=10),
+                cookies=cookies,
+                headers=headers
+            ) as session:
+                async with session.post(SESSION_PROBE_URL, json=SESSION_PROBE_PAYLOAD, allow_redirects=False) as response:
+                    location = response.headers.get('Location', '')
+                    if response.status in (301, 302, 303, 307, 308) and 'seller-auth' in location:
+                        return False
+                    if response.status != 200 or response.content_type != 'application/json':
+                        return None
+                    
+                    # JSON-RPC сообщает об ошибках в теле ответа при статусе 200
+                    payload = await response.json()
+                    results = payload if isinstance(payload, list) else [payload]
+                    if results and all(isinstance(item, dict) and 'result' in item for item in results):
+                        return True
+                    return None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.debug(f"HTTP session probe failed: {e}")
+            return None
     
     async def test_session(self, session_data: Dict) -> bool:
         """Проверить, действительна ли сессия без полного восстановления"""
+        # Быстрый путь: HTTP-запрос с cookies вместо запуска браузера
+        probe_result = await self._probe_session_http(session_data)
+        if probe_result is not None:
+            logger.info(f"{'✅' if probe_result else '❌'} Session checked via HTTP probe: {'valid' if probe_result else 'invalid'}")
+            return probe_result
+        
+        async with self.browser_session():
+            return await self._test_session_in_browser(session_data)
+    
+    async def _test_session_in_browser(self, session_data: Dict) -> bool:
+        """Проверить сессию в браузере (если HTTP-проверка не дала ответа)"""
         try:
             await self._ensure_browser_ready()
 
-            current_url = self.driver.current_url or ""
+            current_url = await self._current_url()
             if not current_url:
-                self.driver.get("https://seller.wildberries.ru/")
-                await asyncio.sleep(1)
-                current_url = self.driver.current_url or ""
+                await run_blocking(self.driver.get, "https://seller.wildberries.ru/")
+                await run_blocking(self._wait_for_page_load)
+                current_url = await self._current_url()
 
             if 'seller-auth.wildberries.ru' in current_url:
                 logger.warning("❌ Session invalid - driver on auth page")
                 return False
 
             try:
-                user_markers = self.driver.find_elements(By.CSS_SELECTOR, '[data-testid*="user"], [class*="header-user"], [class*="profile"]')
+                user_markers = await run_blocking(self.driver.find_elements, By.CSS_SELECTOR, USER_MARKERS_SELECTOR)
                 if user_markers:
                     logger.info("✅ Session is valid - user elements present")
                     return True
             except Exception as exc:
                 logger.debug(f"Could not inspect DOM for auth markers: {exc}")
 
-            await self.ensure_supplies_page()
+            await self.ensure_supplies_page(current_url=current_url)
             return True
+        except WBBrowserBusyError:
+            # Сессию проверить не удалось, но это не значит, что она истекла
+            raise
         except WBWebAuthError:
             logger.warning("❌ Session invalid after navigation attempt")
             return False
@@ -543,91 +821,149 @@ class WBWebAuthService:
             logger.error(f"Error testing session: {e}")
             return False
 
-    async def _restore_cookies_only(self, session_data: Dict):
+    @staticmethod
+    def _to_cdp_cookie(cookie: Dict) -> Dict:
+        """Преобразовать cookie из формата Selenium в формат CDP Network.setCookies"""
+        cdp_cookie = dict(cookie)
+        cdp_cookie.pop('sameSite', None)
+        cdp_cookie.pop('priority', None)
+        expiry = cdp_cookie.pop('expiry', None)
+        if expiry is not None:
+            cdp_cookie['expires'] = int(expiry)
+        if not cdp_cookie.get('domain'):
+            cdp_cookie['domain'] = '.wildberries.ru'
+        if not cdp_cookie.get('path'):
+            cdp_cookie['path'] = '/'
+        return cdp_cookie
+
+    async def _restore_cookies_only(self, session_data: Dict) -> bool:
+        """
+        Установить cookies сессии в браузер через CDP
+        
+        Network.setCookies не требует открытой страницы, поэтому cookies ставятся
+        до первого перехода и первая же загрузка кабинета идет с сессией.
+        
+        Returns:
+            True, если cookies установлены этим вызовом
+        """
         if not session_data.get('cookies'):
             logger.warning("No cookies in session_data to restore")
-            return
+            return False
+
+        # За время жизни браузера cookies восстанавливаем один раз
+        if self._cookies_installed:
+            return False
 
         try:
             logger.info(f"🔑 Restoring {len(session_data['cookies'])} cookies for user {self.user_id}")
-            self.driver.delete_all_cookies()
-            restored_count = 0
-            for cookie in session_data['cookies']:
-                cookie_copy = dict(cookie)
-                if 'expiry' in cookie_copy and isinstance(cookie_copy['expiry'], float):
-                    cookie_copy['expiry'] = int(cookie_copy['expiry'])
-                cookie_copy.pop('sameSite', None)
-                cookie_copy.pop('priority', None)
-                if 'domain' not in cookie_copy or not cookie_copy['domain']:
-                    cookie_copy['domain'] = '.wildberries.ru'
-                if 'path' not in cookie_copy or not cookie_copy['path']:
-                    cookie_copy['path'] = '/'
-                try:
-                    self.driver.add_cookie(cookie_copy)
-                    restored_count += 1
-                except Exception as exc:
-                    logger.debug(f"Could not add cookie {cookie.get('name', 'unknown')}: {exc}")
-            
-            logger.info(f"✅ Restored {restored_count}/{len(session_data['cookies'])} cookies")
+            # В отличие от delete_all_cookies, работает и на about:blank
+            await run_blocking(self.driver.execute_cdp_cmd, 'Network.clearBrowserCookies', {})
 
-            # Восстанавливаем localStorage и sessionStorage
-            if 'local_storage' in session_data:
-                try:
-                    for key, value in session_data['local_storage'].items():
-                        # Экранируем кавычки в значении
-                        value_escaped = str(value).replace("'", "\\'").replace('"', '\\"')
-                        self.driver.execute_script(f"localStorage.setItem('{key}', '{value_escaped}');")
-                    logger.debug(f"Restored {len(session_data['local_storage'])} localStorage items")
-                except Exception as exc:
-                    logger.debug(f"Could not restore localStorage: {exc}")
-            
-            if 'session_storage' in session_data:
-                try:
-                    for key, value in session_data['session_storage'].items():
-                        # Экранируем кавычки в значении
-                        value_escaped = str(value).replace("'", "\\'").replace('"', '\\"')
-                        self.driver.execute_script(f"sessionStorage.setItem('{key}', '{value_escaped}');")
-                    logger.debug(f"Restored {len(session_data['session_storage'])} sessionStorage items")
-                except Exception as exc:
-                    logger.debug(f"Could not restore sessionStorage: {exc}")
-
-            logger.debug("Cookies and storage restored, refreshing page once")
-            self.driver.refresh()
-            await asyncio.sleep(1)
+            # Устанавливаем все cookies одной CDP-командой вместо add_cookie на каждую
+            cdp_cookies = [self._to_cdp_cookie(cookie) for cookie in session_data['cookies']]
+            await run_blocking(self.driver.execute_cdp_cmd, 'Network.setCookies', {'cookies': cdp_cookies})
+            self._cookies_installed = True
+            logger.info(f"✅ Restored {len(cdp_cookies)} cookies")
+            return True
         except Exception as exc:
             logger.warning(f"Lightweight cookie restore failed: {exc}")
+            return False
+
+    async def _restore_storage(self, session_data: Dict):
+        """Восстановить localStorage и sessionStorage (нужна открытая страница кабинета)"""
+        local_storage = session_data.get('local_storage') or {}
+        session_storage = session_data.get('session_storage') or {}
+        if not local_storage and not session_storage:
+            return
+
+        # Хранилище привязано к origin: на странице авторизации оно бесполезно
+        if 'seller.wildberries.ru' not in await self._current_url():
+            return
+
+        # Значения передаются аргументами скрипта, поэтому экранирование не требуется
+        try:
+            await run_blocking(self.driver.execute_script, STORAGE_RESTORE_SCRIPT, local_storage, session_storage)
+            logger.debug(f"Restored {len(local_storage)} localStorage and {len(session_storage)} sessionStorage items")
+        except Exception as exc:
+            logger.debug(f"Could not restore storage: {exc}")
 
-    async def ensure_supplies_page(self, force_reload: bool = False):
-        """Убедиться, что открыт раздел поставок"""
+    async def ensure_supplies_page(self, force_reload: bool = False, current_url: Optional[str] = None):
+        """
+        Убедиться, что открыт раздел поставок
+        
+        Args:
+            force_reload: Перезагрузить страницу, даже если она уже открыта
+            current_url: Уже известный вызывающему коду URL браузера (экономит запрос к драйверу)
+        """
         await self._ensure_browser_ready()
 
         target_url = "https://seller.wildberries.ru/supplies-management/all-supplies"
-        current_url = self.driver.current_url or ""
+        if current_url is None:
+            current_url = await self._current_url()
 
         if 'seller-auth.wildberries.ru' in current_url:
             raise WBWebAuthError("Необходима переавторизация")
 
         if force_reload or 'supplies-management/all-supplies' not in current_url:
             logger.info(f"🌐 Navigating to supplies page: {target_url}")
-            self.driver.get(target_url)
+            await run_blocking(self.driver.get, target_url)
         else:
             logger.info("🔄 Refreshing supplies page for fresh data")
-            self.driver.refresh()
-
-        await asyncio.sleep(1)
+            await run_blocking(self.driver.refresh)
 
         try:
-            self.wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'table[class^="Table__table"] tbody'))
+            await run_blocking(
+                self.wait.until,
+                EC.presence_of_element_located((By.CSS_SELECTOR, SUPPLIES_TABLE_BODY_SELECTOR))
             )
             logger.info("✅ Supplies page ready")
         except TimeoutException:
-            current_url = self.driver.current_url or ''
+            current_url = await self._current_url()
             logger.error(f"❌ Supplies page not loaded, current URL: {current_url}")
             raise WBWebAuthError("Не удалось открыть страницу поставок")
 
+    def _collect_unplanned_order_numbers(self) -> list[str]:
+        """Собрать номера заказов со статусом 'не запланировано' из таблицы поставок"""
+        # Все строки разбираются в браузере одним запросом вместо find_element на каждую строку
+        try:
+            rows = self.driver.execute_script(
+                SUPPLIES_ROWS_SCRIPT,
+                SUPPLIES_TABLE_ROWS_SELECTOR,
+                SUPPLIES_ORDER_CELL_SELECTOR,
+                SUPPLIES_BADGE_SELECTOR,
+                SUPPLIES_CELL_SELECTOR
+            )
+        except WebDriverException as e:
+            logger.warning(f"Batch supplies table parsing failed, parsing row by row: {e}")
+            return self._read_unplanned_order_numbers()
+        
+        return [
+            order_text
+            for order_text, status_text in rows
+            if order_text and order_text != '-' and 'не запланировано' in status_text
+        ]
+
+    def _read_unplanned_order_numbers(self) -> list[str]:
+        """Найти номера незапланированных заказов по строкам (запасной вариант для SUPPLIES_ROWS_SCRIPT)"""
+        order_numbers = []
+        # Статус проверяет XPath в браузере: запросы к драйверу идут только по подходящим строкам
+        for row in self.driver.find_elements(By.XPATH, SUPPLIES_UNPLANNED_ROWS_XPATH):
+            # find_elements вместо find_element: промах не стоит исключения и лишнего round-trip
+            order_cells = row.find_elements(By.CSS_SELECTOR, SUPPLIES_ORDER_CELL_SELECTOR)
+            if not order_cells:
+                continue
+            
+            order_text = (order_cells[0].text or '').strip()
+            if order_text and order_text != '-':
+                order_numbers.append(order_text)
+        return order_numbers
+
     async def get_unplanned_order_numbers(self, session_data: Dict) -> list[str]:
         """Загрузить страницу всех поставок и вернуть номера заказов со статусом 'не запланировано'."""
+        async with self.browser_session():
+            return await self._get_unplanned_order_numbers(session_data)
+    
+    async def _get_unplanned_order_numbers(self, session_data: Dict) -> list[str]:
         max_retries = 2
         retry_count = 0
         
@@ -636,35 +972,51 @@ class WBWebAuthService:
                 # Проверяем, готов ли браузер
                 await self._ensure_browser_ready()
 
-                # Восстанавливаем cookies из session_data
-                current_url = self.driver.current_url or ""
+                # Восстанавливаем cookies из session_data до первого перехода,
+                # иначе холодный профиль сразу уйдет на страницу авторизации
+                cookies_restored = await self._restore_cookies_only(session_data)
+
+                current_url = await self._current_url()
                 if not current_url or 'seller.wildberries.ru' not in current_url:
                     # Если мы не на странице WB, сначала переходим туда
-                    self.driver.get("https://seller.wildberries.ru/")
-                    await asyncio.sleep(1)
-                
-                # Восстанавливаем cookies
-                await self._restore_cookies_only(session_data)
+                    await run_blocking(self.driver.get, "https://seller.wildberries.ru/")
+                    await run_blocking(self._wait_for_page_load)
+                    # После перехода URL мог смениться (например, редирект на авторизацию)
+                    current_url = None
+
+                # localStorage доступен только на открытой странице кабинета;
+                # ensure_supplies_page ниже перезагрузит ее уже с восстановленным хранилищем
+                if cookies_restored:
+                    await self._restore_storage(session_data)
 
                 # Каждый запрос списка выполняем с полной перезагрузкой страницы,
                 # чтобы гарантированно получить актуальные данные
-                await self.ensure_supplies_page(force_reload=True)
+                await self.ensure_supplies_page(force_reload=True, current_url=current_url)
 
-                # Даём странице обновить данные после перезагрузки
-                await asyncio.sleep(1)
+                # Даём странице обновить данные после перезагрузки (не дольше секунды)
+                try:
+                    await run_blocking(
+                        self._wait_until,
+                        EC.presence_of_element_located((By.CSS_SELECTOR, SUPPLIES_TABLE_ROWS_SELECTOR)),
+                        timeout=1
+                    )
+                except TimeoutException:
+                    pass
 
                 # Ждем появления таблицы
                 try:
-                    self.wait.until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, 'table[class^="Table__table"] tbody'))
+                    await run_blocking(
+                        self.wait.until,
+                        EC.presence_of_element_located((By.CSS_SELECTOR, SUPPLIES_TABLE_BODY_SELECTOR))
                     )
                 except TimeoutException:
                     # Проверяем, не перекинуло ли на страницу авторизации
-                    current_url = self.driver.current_url or ''
+                    current_url = await self._current_url()
                     if 'seller-auth.wildberries.ru' in current_url:
                         logger.warning(f"Redirected to auth page, attempt {retry_count + 1}/{max_retries}")
                         if retry_count < max_retries - 1:
-                            # Попробуем обновить сессию
+                            # Попробуем обновить сессию: при повторе cookies установятся заново
+                            self._cookies_installed = False
                             await asyncio.sleep(2)
                             retry_count += 1
                             continue
@@ -674,40 +1026,13 @@ class WBWebAuthService:
                     return []
 
                 # Если дошли сюда, значит авторизация прошла успешно
-                rows = self.driver.find_elements(By.CSS_SELECTOR, 'table[class^="Table__table"] tbody tr')
-                order_numbers: list[str] = []
-
-                for row in rows:
-                    try:
-                        # Первая колонка — номер заказа
-                        first_cell = row.find_element(By.CSS_SELECTOR, 'td:nth-child(1) .Table__td-content__OpbOC9lNW1')
-                        order_text = (first_cell.text or '').strip()
-                        if not order_text or order_text == '-':
-                            continue
-
-                        # Ищем badge статуса в строке
-                        badge_elements = row.find_elements(By.CSS_SELECTOR, '.Status-name-cell__8hNdIcukfX [data-name="Badge"], .Status-name-cell__status__CtSiazcngL [data-name="Badge"], span[data-name="Badge"]')
-                        status_text = ''
-                        if badge_elements:
-                            status_text = (badge_elements[-1].text or '').strip().lower()
-                        else:
-                            # Фолбэк: попытка найти текст статуса в ячейках ближе к концу
-                            try:
-                                status_cell = row.find_elements(By.CSS_SELECTOR, 'td')[-2]
-                                status_text = (status_cell.text or '').strip().lower()
-                            except Exception:
-                                status_text = ''
-
-                        if 'не запланировано' in status_text:
-                            order_numbers.append(order_text)
-                    except Exception:
-                        continue
+                order_numbers = await run_blocking(self._collect_unplanned_order_numbers)
 
                 logger.info(f"Successfully retrieved {len(order_numbers)} unplanned orders")
                 return order_numbers
 
             except WBWebAuthError as e:
-                if str(e) == 'AUTH_REQUIRED':
+                if str(e) == 'AUTH_REQUIRED' or isinstance(e, WBBrowserBusyError):
                     raise
                 logger.error(f"WBWebAuthError in get_unplanned_order_numbers: {e}")
                 return []
@@ -727,20 +1052,19 @@ class WBWebAuthService:
 _user_wb_auth_services: Dict[int, WBWebAuthService] = {}
 
 
-def get_wb_auth_service(user_id: int = None) -> WBWebAuthService:
+async def get_wb_auth_service(user_id: int = None) -> WBWebAuthService:
     """
     Получить экземпляр сервиса авторизации для пользователя
     
     Args:
         user_id: ID пользователя Telegram. Если None, создается временный экземпляр
     """
-    global _user_wb_auth_services
-    
     # Если ID пользователя не указан, создаем временный экземпляр
     if user_id is None:
         return WBWebAuthService()
     
-    # Если для пользователя еще нет экземпляра, создаем новый
+    # Между проверкой и созданием нет await, поэтому параллельные запросы получают
+    # один экземпляр; параллельный запуск браузера исключает блокировка в _initialize_browser
     if user_id not in _user_wb_auth_services:
         logger.info(f"Creating new WBWebAuthService for user {user_id}")
         _user_wb_auth_services[user_id] = WBWebAuthService(user_id=user_id)
@@ -0,0 +1,377 @@
+"""Пул браузеров WebDriver для повторного использования между сессиями"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import async_timeout
+from selenium import webdriver
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+from loguru import logger
+
+from app.config.settings import settings
+from app.utils.browser_config import create_undetectable_chrome_options
+
+
+# Общий пул потоков для блокирующих вызовов Selenium: каждый вызов - HTTP-запрос
+# к ChromeDriver, который иначе останавливает цикл событий бота
+selenium_executor = ThreadPoolExecutor(
+    max_workers=settings.WB_MAX_BROWSERS,
+    thread_name_prefix="selenium"
+)
+
+# Верхняя граница ожидания одного вызова Selenium: с запасом покрывает
+# WebDriverWait (15 секунд) и загрузку страницы
+SELENIUM_CALL_TIMEOUT = 60
+
+
+def _patch_connection_pool_size(maxsize: int):
+    """
+    Увеличить размер пула соединений urllib3 у RemoteConnection.
+    
+    По умолчанию urllib3 держит одно соединение на хост, поэтому параллельные
+    команды к одному ChromeDriver из пула потоков выполняются по очереди и
+    сопровождаются предупреждениями "Connection pool is full".
+    """
+    original = RemoteConnection._get_connection_manager
+    if getattr(original, '_wb_pool_patched', False):
+        return
+    
+    @functools.wraps(original)
+    def _get_connection_manager(self):
+        manager = original(self)
+        manager.connection_pool_kw['maxsize'] = maxsize
+        return manager
+    
+    _get_connection_manager._wb_pool_patched = True
+    RemoteConnection._get_connection_manager = _get_connection_manager
+
+
+_patch_connection_pool_size(settings.WB_MAX_BROWSERS)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Выполнить блокирующий вызов Selenium в общем пуле потоков"""
+    loop = asyncio.get_running_loop()
+    # async_timeout не создает отдельную задачу на каждый вызов, в отличие от asyncio.wait_for
+    async with async_timeout.timeout(SELENIUM_CALL_TIMEOUT):
+        return await loop.run_in_executor(selenium_executor, functools.partial(func, *args, **kwargs))
+
+
+class BrowserPoolTimeoutError(Exception):
+    """Свободный браузер не освободился в пуле за отведенное время"""
+    pass
+
+
+class WebDriverPool:
+    """
+    Пул запущенных браузеров Chrome, сгруппированных по директории профиля.
+    
+    Вместо запуска нового Chrome на каждую операцию браузер возвращается в пул
+    и переиспользуется при следующем запросе с тем же профилем. Общее число
+    живых браузеров ограничено семафором, простаивающие браузеры закрываются
+    фоновой задачей по истечении TTL. Если все места заняты, новый профиль
+    вытесняет дольше всех простаивающий браузер другого профиля, а не ждет TTL.
+    Браузеры, которые не вернули в пул дольше max_checkout, закрываются той же
+    задачей. Ожидающий места запрос просыпается при каждом возврате браузера
+    и повторяет поиск, а общее ожидание ограничено acquire_timeout.
+    """
+    
+    def __init__(
+        self,
+        max_browsers: int,
+        idle_ttl: float,
+        acquire_timeout: float,
+        max_checkout: float
+    ):
+        self._max_browsers = max_browsers
+        self._idle_ttl = idle_ttl
+        self._acquire_timeout = acquire_timeout
+        self._max_checkout = max_checkout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Сигнал о возврате браузера в пул или освобождении места
+        self._available: Optional[asyncio.Condition] = None
+        # Свободные браузеры: profile_dir -> очередь (driver, released_at)
+        self._idle: Dict[str, asyncio.Queue] = {}
+        # Все живые браузеры: id(driver) -> profile_dir
+        self._profiles: Dict[int, str] = {}
+        # Выданные браузеры: id(driver) -> (driver, время выдачи)
+        self._checked_out: Dict[int, Tuple[webdriver.Chrome, float]] = {}
+        self._reaper_task: Optional[asyncio.Task] = None
+        # Блокировки по профилю, чтобы параллельные запросы не делили один браузер
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_browsers)
+        return self._semaphore
+    
+    def _get_condition(self) -> asyncio.Condition:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+    
+    def _get_idle_queue(self, profile_dir: str) -> asyncio.Queue:
+        if profile_dir not in self._idle:
+            self._idle[profile_dir] = asyncio.Queue()
+        return self._idle[profile_dir]
+    
+    def _ensure_reaper(self):
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reap_idle_drivers())
+    
+    async def acquire(self, profile_dir: str) -> webdriver.Chrome:
+        """Взять браузер для профиля из пула или запустить новый"""
+        self._ensure_reaper()
+        
+        if profile_dir not in self._locks:
+            self._locks[profile_dir] = asyncio.Lock()
+        
+        async with self._locks[profile_dir]:
+            semaphore = self._get_semaphore()
+            deadline = time.monotonic() + self._acquire_timeout
+            while True:
+                driver = await self._take_idle(profile_dir)
+                if driver is not None:
+                    return driver
+                
+                if not semaphore.locked():
+                    await semaphore.acquire()
+                    break
+                
+                # Все места заняты: освобождаем место за счет простаивающего браузера
+                if await self._evict_oldest_idle():
+                    continue
+                
+                # Ждем возврата или закрытия браузера: вернувшийся браузер этого профиля
+                # переиспользуется, а браузер другого профиля вытесняется на следующем круге
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not await self._wait_available(remaining):
+                    raise BrowserPoolTimeoutError(
+                        f"No free browser in pool after {self._acquire_timeout:.0f}s"
+                    )
+            
+            try:
+                driver = await run_blocking(self._spawn, profile_dir)
+            except Exception:
+                semaphore.release()
+                await self._notify_available()
+                raise
+            
+            self._profiles[id(driver)] = profile_dir
+            self._checked_out[id(driver)] = (driver, time.monotonic())
+            return driver
+    
+    async def _take_idle(self, profile_dir: str) -> Optional[webdriver.Chrome]:
+        """Взять живой свободный браузер профиля, закрывая сломанные"""
+        queue = self._get_idle_queue(profile_dir)
+        while not queue.empty():
+            driver, _ = queue.get_nowait()
+            if await run_blocking(self._is_alive, driver):
+                logger.info(f"Reusing pooled browser for profile {profile_dir}")
+                self._checked_out[id(driver)] = (driver, time.monotonic())
+                return driver
+            await self._quit(driver)
+        return None
+    
+    async def _wait_available(self, timeout: float) -> bool:
+        """Дождаться возврата или закрытия браузера; False - если время вышло"""
+        condition = self._get_condition()
+        try:
+            async with async_timeout.timeout(timeout):
+                async with condition:
+                    await condition.wait()
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    async def _notify_available(self):
+        """Разбудить ожидающих свободного браузера"""
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+    
+    def is_checked_out(self, driver: webdriver.Chrome) -> bool:
+        """Проверить, что браузер выдан из пула и еще не закрыт им"""
+        return id(driver) in self._checked_out
+    
+    async def release(self, driver: Optional[webdriver.Chrome]):
+        """Вернуть браузер в пул"""
+        if driver is None:
+            return
+        
+        self._checked_out.pop(id(driver), None)
+        profile_dir = self._profiles.get(id(driver))
+        if profile_dir is None:
+            # Браузер запущен не через пул - просто закрываем его
+            try:
+                await run_blocking(driver.quit)
+            except Exception:
+                pass
+            return
+        
+        try:
+            await run_blocking(driver.get, "about:blank")
+        except Exception as e:
+            logger.debug(f"Pooled browser is broken, closing it: {e}")
+            await self._quit(driver)
+            return
+        
+        self._get_idle_queue(profile_dir).put_nowait((driver, time.monotonic()))
+        await self._notify_available()
+    
+    async def prewarm(self, profile_dirs: List[str]):
+        """Заранее запустить браузеры для профилей, чтобы первый запрос не ждал старта Chrome"""
+        for profile_dir in profile_dirs[:self._max_browsers]:
+            try:
+                driver = await self.acquire(profile_dir)
+                await self.release(driver)
+                logger.info(f"Prewarmed browser for profile {profile_dir}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not prewarm browser for profile {profile_dir}: {e}")
+    
+    async def initialize_profile(self, profile_dir: str):
+        """Запустить и закрыть браузер с профилем, чтобы Chrome создал его файлы"""
+        semaphore = self._get_semaphore()
+        async with semaphore:
+            driver = await run_blocking(self._spawn, profile_dir)
+            try:
+                await run_blocking(driver.quit)
+            except Exception:
+                pass
+        await self._notify_available()
+    
+    async def close_all(self):
+        """Закрыть все свободные браузеры и остановить фоновую очистку"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        
+        for queue in self._idle.values():
+            while not queue.empty():
+                driver, _ = queue.get_nowait()
+                await self._quit(driver)
+        self._idle.clear()
+    
+    def _spawn(self, profile_dir: str) -> webdriver.Chrome:
+        """Запустить новый браузер с профилем"""
+        options = create_undetectable_chrome_options(profile_dir=profile_dir)
+        
+        try:
+            # Пытаемся запустить браузер стандартным способом
+            driver = webdriver.Chrome(options=options)
+            logger.info("Browser started successfully with default Chrome")
+            return driver
+        except Exception as e:
+            logger.warning(f"Could not start Chrome with default method: {e}")
+        
+        try:
+            # Пробуем указать явно путь к chromium для Linux-систем
+            options.binary_location = "/usr/bin/chromium"
+            driver = webdriver.Chrome(options=options)
+            logger.info("Browser started using explicit chromium path")
+            return driver
+        except Exception as e:
+            logger.error(f"Failed to start Chrome with explicit path: {e}")
+        
+        # Последняя попытка - использовать chromium-browser
+        try:
+            options.binary_location = "/usr/bin/chromium-browser"
+            driver = webdriver.Chrome(options=options)
+            logger.info("Browser started using chromium-browser path")
+            return driver
+        except Exception as e:
+            logger.error(f"All browser initialization methods failed: {e}")
+            raise
+    
+    @staticmethod
+    def _is_alive(driver: webdriver.Chrome) -> bool:
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+    
+    async def _quit(self, driver: webdriver.Chrome):
+        """Закрыть браузер и освободить место в пуле"""
+        try:
+            await run_blocking(driver.quit)
+        except Exception:
+            pass
+        
+        self._checked_out.pop(id(driver), None)
+        profile_dir = self._profiles.pop(id(driver), None)
+        if profile_dir is not None:
+            self._get_semaphore().release()
+            await self._notify_available()
+    
+    async def _evict_oldest_idle(self) -> bool:
+        """
+        Закрыть браузер, который простаивает дольше всех, чтобы освободить место в пуле.
+        
+        Возвращает False, если свободных браузеров нет.
+        """
+        oldest_profile = None
+        oldest_released_at = None
+        for profile_dir, queue in self._idle.items():
+            items = []
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            for item in items:
+                queue.put_nowait(item)
+            # Браузеры лежат в очереди в порядке освобождения, первый - самый старый
+            if items and (oldest_released_at is None or items[0][1] < oldest_released_at):
+                oldest_profile, oldest_released_at = profile_dir, items[0][1]
+        
+        if oldest_profile is None:
+            return False
+        
+        driver, _ = self._idle[oldest_profile].get_nowait()
+        logger.info(f"Browser pool is full, closing idle browser for profile {oldest_profile}")
+        await self._quit(driver)
+        return True
+    
+    async def _reap_idle_drivers(self):
+        """Периодически закрывать браузеры, простаивающие дольше TTL"""
+        while True:
+            try:
+                await asyncio.sleep(60)
+                
+                now = time.monotonic()
+                for profile_dir, queue in list(self._idle.items()):
+                    keep: list[Tuple[webdriver.Chrome, float]] = []
+                    while not queue.empty():
+                        driver, released_at = queue.get_nowait()
+                        if now - released_at > self._idle_ttl:
+                            logger.info(f"Closing idle browser for profile {profile_dir}")
+                            await self._quit(driver)
+                        else:
+                            keep.append((driver, released_at))
+                    for item in keep:
+                        queue.put_nowait(item)
+                
+                # Браузеры, которые так и не вернули в пул, занимают место навсегда
+                for driver, acquired_at in list(self._checked_out.values()):
+                    if now - acquired_at > self._max_checkout:
+                        logger.warning(
+                            f"Closing browser checked out for {now - acquired_at:.0f}s "
+                            f"(profile {self._profiles.get(id(driver))})"
+                        )
+                        await self._quit(driver)
+            
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error reaping idle browsers: {e}")
+
+
+# Глобальный пул браузеров
+wb_driver_pool = WebDriverPool(
+    max_browsers=settings.WB_MAX_BROWSERS,
+    idle_ttl=settings.WB_BROWSER_IDLE_TTL,
+    acquire_timeout=settings.WB_BROWSER_ACQUIRE_TIMEOUT,
+    max_checkout=settings.WB_BROWSER_MAX_CHECKOUT
+)
@@ -1,14 +1,47 @@
 """Интеграция с Wildberries API"""
 
 import asyncio
-import ssl
-from typing import Dict, List, Optional, Any
+import hashlib
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import aiohttp
-import certifi
+import ijson
+import orjson
 from loguru import logger
 
 from app.config.settings import settings
+from app.utils.http_client import get_shared_connector
+
+
+# Повторы запросов при 429, 5xx и сетевых ошибках: экспоненциальная задержка с джиттером
+MAX_REQUEST_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# Лимит Supplies API: около 6 запросов в минуту, короткие всплески до 6 запросов подряд
+SUPPLIES_RATE_PER_SECOND = 6 / 60
+SUPPLIES_BURST = 6
+
+# Время жизни кэша ответов Supplies API (секунды) и максимальный размер кэша.
+# Кэш коэффициентов короче SLOT_CHECK_INTERVAL, чтобы мониторинг не пропускал новые слоты,
+# но запросы разных мониторингов одного токена в рамках одного цикла объединяются
+WAREHOUSES_CACHE_TTL = 3600
+COEFFICIENTS_CACHE_TTL = 10
+RESPONSE_CACHE_MAX_SIZE = 256
+
+# Время жизни результата проверки API токена: отказ кэшируется коротко,
+# чтобы исправленный в кабинете WB токен быстро снова считался валидным
+TOKEN_VALID_CACHE_TTL = 600
+TOKEN_INVALID_CACHE_TTL = 30
+
+# Проверка названия типа упаковки (в нижнем регистре) по типу поставки
+BOX_TYPE_FILTERS: Dict[str, Callable[[str], bool]] = {
+    'both': lambda box_type: True,
+    'fbs': lambda box_type: 'коробки' in box_type or 'box' in box_type,
+    'fbo': lambda box_type: 'монопаллеты' in box_type or 'суперсейф' in box_type,
+}
 
 
 class WildberriesAPIError(Exception):
@@ -31,45 +64,116 @@ class WildberriesAPI:
         self.common_url = settings.WB_COMMON_API_URL
         self.supplies_url = settings.WB_SUPPLIES_API_URL
         self.session: Optional[aiohttp.ClientSession] = None
-        # Отслеживание rate limiting для Supplies API
-        self._last_supplies_request = 0.0
-        self._supplies_min_interval = 10.0  # Минимум 10 секунд между запросами
+        # Token bucket для rate limiting Supplies API
+        self._supplies_tokens = float(SUPPLIES_BURST)
+        self._supplies_last_refill = time.monotonic()
+        self._supplies_lock = asyncio.Lock()
+        # Кэш ответов: ключ -> (время получения, ответ)
+        self._cache: Dict[Tuple, Tuple[float, Any]] = {}
+        # Выполняющиеся запросы: ключ кэша -> задача, которую ждут все промахнувшиеся вызовы
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        # Кэш проверки токенов: ключ токена -> (время истечения, результат)
+        self._token_valid_cache: Dict[str, Tuple[float, bool]] = {}
     
     async def __aenter__(self):
-        """Async context manager entry"""
-        # Создаем SSL контекст с certifi для корректной работы с сертификатами
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        
-        # Создаем коннектор с SSL контекстом
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        
-        self.session = aiohttp.ClientSession(
-            connector=connector,
-            timeout=aiohttp.ClientTimeout(total=30),
-            headers={
-                'User-Agent': 'WildberriesBot/1.0',
-                'Content-Type': 'application/json'
-            }
-        )
+        """Async context manager entry (сессия общая и живет до остановки бота)"""
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit"""
-        if self.session:
+        """Async context manager exit (сессия закрывается в aclose)"""
+        pass
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Получить долгоживущую HTTP-сессию, создав ее при первом запросе"""
+        if self.session is None or self.session.closed:
+            # Общий пул keep-alive соединений; сессия им не владеет и не закрывает его
+            self.session = aiohttp.ClientSession(
+                connector=get_shared_connector(),
+                connector_owner=False,
+                timeout=aiohttp.ClientTimeout(total=30, connect=10),
+                headers={
+                    'User-Agent': 'WildberriesBot/1.0',
+                    'Content-Type': 'application/json'
+                }
+            )
+        return self.session
+    
+    async def aclose(self):
+        """Закрыть HTTP-сессию (вызывается при остановке бота)"""
+        if self.session and not self.session.closed:
             await self.session.close()
+        self.session = None
     
     async def _ensure_supplies_rate_limit(self):
-        """Обеспечить соблюдение rate limit для Supplies API"""
-        import time
-        current_time = time.time()
-        time_since_last = current_time - self._last_supplies_request
+        """Обеспечить соблюдение rate limit для Supplies API (token bucket)"""
+        async with self._supplies_lock:
+            now = time.monotonic()
+            self._supplies_tokens = min(
+                SUPPLIES_BURST,
+                self._supplies_tokens + (now - self._supplies_last_refill) * SUPPLIES_RATE_PER_SECOND
+            )
+            self._supplies_last_refill = now
+            
+            if self._supplies_tokens < 1:
+                sleep_time = (1 - self._supplies_tokens) / SUPPLIES_RATE_PER_SECOND
+                logger.info(f"Rate limiting: waiting {sleep_time:.1f}s before next Supplies API request")
+                await asyncio.sleep(sleep_time)
+                self._supplies_tokens = 1.0
+                self._supplies_last_refill = time.monotonic()
+            
+            self._supplies_tokens -= 1
+    
+    @staticmethod
+    def _token_key(api_token: str) -> str:
+        """Ключ кэша для токена (сам токен в кэше не хранится)"""
+        return hashlib.blake2b(api_token.encode(), digest_size=16).hexdigest()
+    
+    async def _cached_call(self, key: Tuple, ttl: float, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Вернуть ответ из кэша, если он моложе ttl, иначе выполнить запрос и сохранить
+        
+        Одновременные промахи по одному ключу ждут один общий запрос, а не тратят
+        каждый свой токен лимита Supplies API. Вызывающий код получает копию ответа
+        и может изменять ее, не портя кэш.
+        """
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return self._copy_response(cached[1])
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_cache(key, coro_factory))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(key, done))
         
-        if time_since_last < self._supplies_min_interval:
-            sleep_time = self._supplies_min_interval - time_since_last
-            logger.info(f"Rate limiting: waiting {sleep_time:.1f}s before next Supplies API request")
-            await asyncio.sleep(sleep_time)
+        # shield: отмена одного вызывающего не отменяет запрос, который ждут остальные
+        result = await asyncio.shield(task)
+        return self._copy_response(result)
+    
+    async def _fetch_and_cache(self, key: Tuple, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить запрос и сохранить ответ в кэше"""
+        result = await coro_factory()
         
-        self._last_supplies_request = time.time()
+        if key not in self._cache and len(self._cache) >= RESPONSE_CACHE_MAX_SIZE:
+            # Вытесняем самую старую запись
+            oldest_key = min(self._cache, key=lambda k: self._cache[k][0])
+            del self._cache[oldest_key]
+        self._cache[key] = (time.monotonic(), result)
+        return result
+    
+    def _finish_inflight(self, key: Tuple, task: asyncio.Future):
+        """Убрать завершенный запрос из ожидающих"""
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Забираем исключение, даже если все ожидавшие вызовы уже отменены
+            task.exception()
+    
+    @staticmethod
+    def _copy_response(result: Any) -> Any:
+        """Копия списка и его словарей верхнего уровня (ответы Supplies API плоские)"""
+        if isinstance(result, list):
+            return [dict(item) if isinstance(item, dict) else item for item in result]
+        return result
     
     async def _make_request(
         self, 
@@ -78,48 +182,115 @@ class WildberriesAPI:
         headers: Dict[str, str], 
         **kwargs
     ) -> Dict[str, Any]:
-        """Выполнить HTTP запрос к API"""
-        if not self.session or self.session.closed:
-            # Пересоздаем сессию если она закрыта
-            ssl_context = ssl.create_default_context(cafile=certifi.where())
-            timeout = aiohttp.ClientTimeout(total=30, connect=10)
-            self.session = aiohttp.ClientSession(
-                timeout=timeout,
-                connector=aiohttp.TCPConnector(ssl=ssl_context),
-                headers={
-                    'User-Agent': 'WildberriesBot/1.0',
-                    'Content-Type': 'application/json'
-                }
-            )
+        """Выполнить HTTP запрос к API (429, 5xx и сетевые ошибки повторяются с задержкой)"""
+        session = await self._get_session()
+        
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            is_last_attempt = attempt == MAX_REQUEST_ATTEMPTS - 1
+            
+            if attempt and url.startswith(self.supplies_url):
+                # Первую попытку вызывающий код уже учел в лимите, повторы тоже расходуют лимит
+                await self._ensure_supplies_rate_limit()
+            
+            try:
+                async with session.request(method, url, headers=headers, **kwargs) as response:
+                    # Тело читаем один раз в байтах и разбираем orjson без промежуточной строки
+                    body = await response.read()
+                    
+                    if response.status == 429 and not is_last_attempt:
+                        delay = self._get_retry_delay(attempt, response.headers.get('Retry-After'))
+                        logger.warning(f"Wildberries API rate limit, retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    elif response.status >= 500 and not is_last_attempt:
+                        delay = self._get_retry_delay(attempt)
+                        logger.warning(f"Wildberries API HTTP {response.status}, retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    
+                    self._raise_for_status(response, body)
+                    
+                    # Проверяем, что ответ не пустой
+                    if not body.strip():
+                        return {}
+                    
+                    return orjson.loads(body)
+                    
+            except WildberriesAPIError:
+                raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if not is_last_attempt:
+                    delay = self._get_retry_delay(attempt)
+                    logger.warning(f"Network error in Wildberries API: {e}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error(f"Network error in Wildberries API: {e}")
+                raise WildberriesAPIError(f"Сетевая ошибка: {e}")
+            except aiohttp.ClientError as e:
+                logger.error(f"Network error in Wildberries API: {e}")
+                raise WildberriesAPIError(f"Сетевая ошибка: {e}")
+            except Exception as e:
+                logger.error(f"Unexpected error in Wildberries API: {e}")
+                raise WildberriesAPIError(f"Неожиданная ошибка: {e}")
+    
+    async def _stream_json_items(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        **kwargs
+    ) -> AsyncIterator[Any]:
+        """
+        Выполнить HTTP запрос и отдавать элементы JSON-массива по мере чтения ответа
+        
+        Ответ не собирается в память целиком, поэтому запрос не повторяется:
+        часть элементов к моменту ошибки уже может быть обработана вызывающим кодом.
+        """
+        session = await self._get_session()
         
         try:
-            async with self.session.request(method, url, headers=headers, **kwargs) as response:
-                response_text = await response.text()
-                
-                if response.status == 401:
-                    raise WildberriesAuthError("Неверный API токен")
-                elif response.status == 403:
-                    raise WildberriesAuthError("Доступ запрещен. Проверьте права API токена")
-                elif response.status == 429:
-                    # Получаем заголовок Retry-After если есть
-                    retry_after = response.headers.get('Retry-After', '60')
-                    raise WildberriesAPIError(f"Превышен лимит запросов. Повторите через {retry_after} секунд")
-                elif response.status >= 400:
-                    raise WildberriesAPIError(f"HTTP {response.status}: {response_text}")
-                
-                # Проверяем, что ответ не пустой
-                if not response_text.strip():
-                    return {}
+            async with session.request(method, url, headers=headers, **kwargs) as response:
+                if response.status >= 400:
+                    self._raise_for_status(response, await response.read())
                 
-                return await response.json()
-                
-        except aiohttp.ClientError as e:
+                async for item in ijson.items(response.content, 'item', use_float=True):
+                    yield item
+                    
+        except WildberriesAPIError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Network error in Wildberries API: {e}")
             raise WildberriesAPIError(f"Сетевая ошибка: {e}")
         except Exception as e:
             logger.error(f"Unexpected error in Wildberries API: {e}")
             raise WildberriesAPIError(f"Неожиданная ошибка: {e}")
     
+    @staticmethod
+    def _raise_for_status(response: aiohttp.ClientResponse, body: bytes):
+        """Выбросить ошибку API для неуспешного HTTP статуса"""
+        if response.status == 401:
+            raise WildberriesAuthError("Неверный API токен")
+        elif response.status == 403:
+            raise WildberriesAuthError("Доступ запрещен. Проверьте права API токена")
+        elif response.status == 429:
+            # Получаем заголовок Retry-After если есть
+            retry_after = response.headers.get('Retry-After', '60')
+            raise WildberriesAPIError(f"Превышен лимит запросов. Повторите через {retry_after} секунд")
+        elif response.status >= 400:
+            raise WildberriesAPIError(
+                f"HTTP {response.status}: {body[:500].decode('utf-8', 'replace')}"
+            )
+    
+    @staticmethod
+    def _get_retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+        """Задержка перед повтором: Retry-After сервера или экспонента с джиттером (не больше RETRY_MAX_DELAY)"""
+        if retry_after:
+            try:
+                return min(RETRY_MAX_DELAY, float(int(retry_after)))
+            except ValueError:
+                pass
+        return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)) * (1 + random.uniform(0, 0.5))
+    
     
     async def get_seller_info(self, api_token: str) -> Dict[str, Any]:
         """Получить информацию о продавце через Common API"""
@@ -139,18 +310,38 @@ class WildberriesAPI:
             raise
     
     async def validate_api_token(self, api_token: str) -> bool:
-        """Проверить валидность API токена через seller-info"""
+        """Проверить валидность API токена через seller-info (результат кэшируется)"""
+        key = self._token_key(api_token)
+        cached = self._token_valid_cache.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        
         try:
             await self.get_seller_info(api_token)
+            self._remember_token_validity(key, True, TOKEN_VALID_CACHE_TTL)
             return True
         except WildberriesAuthError:
+            self._remember_token_validity(key, False, TOKEN_INVALID_CACHE_TTL)
             return False
         except Exception as e:
+            # Сетевые ошибки не кэшируем: о токене они ничего не говорят
             logger.warning(f"Error validating API token: {e}")
             return False
     
+    def _remember_token_validity(self, key: str, is_valid: bool, ttl: float):
+        """Сохранить результат проверки токена в кэше"""
+        if key not in self._token_valid_cache and len(self._token_valid_cache) >= RESPONSE_CACHE_MAX_SIZE:
+            # Вытесняем запись, которая истекает раньше всех
+            oldest_key = min(self._token_valid_cache, key=lambda k: self._token_valid_cache[k][0])
+            del self._token_valid_cache[oldest_key]
+        self._token_valid_cache[key] = (time.monotonic() + ttl, is_valid)
+    
     async def get_warehouses(self, api_token: str) -> List[Dict[str, Any]]:
-        """Получить список всех складов WB через Supplies API"""
+        """Получить список всех складов WB через Supplies API (с кэшем на WAREHOUSES_CACHE_TTL)"""
+        key = ('warehouses', self._token_key(api_token))
+        return await self._cached_call(key, WAREHOUSES_CACHE_TTL, lambda: self._fetch_warehouses(api_token))
+    
+    async def _fetch_warehouses(self, api_token: str) -> List[Dict[str, Any]]:
         # Соблюдаем rate limit для Supplies API
         await self._ensure_supplies_rate_limit()
         
@@ -164,7 +355,15 @@ class WildberriesAPI:
         return response if isinstance(response, list) else []
     
     async def get_acceptance_coefficients(self, api_token: str, warehouse_ids: List[int] = None) -> List[Dict[str, Any]]:
-        """Получить коэффициенты приёмки для складов WB"""
+        """Получить коэффициенты приёмки для складов WB (с кэшем на COEFFICIENTS_CACHE_TTL)"""
+        key = ('coefficients', self._token_key(api_token), tuple(warehouse_ids or ()))
+        return await self._cached_call(
+            key,
+            COEFFICIENTS_CACHE_TTL,
+            lambda: self._fetch_acceptance_coefficients(api_token, warehouse_ids)
+        )
+    
+    async def _fetch_acceptance_coefficients(self, api_token: str, warehouse_ids: List[int] = None) -> List[Dict[str, Any]]:
         # Соблюдаем rate limit для Supplies API
         await self._ensure_supplies_rate_limit()
         
@@ -181,6 +380,20 @@ class WildberriesAPI:
         response = await self._make_request('GET', url, headers, params=params)
         return response if isinstance(response, list) else []
     
+    async def _stream_acceptance_coefficients(self, api_token: str) -> AsyncIterator[Dict[str, Any]]:
+        """Потоково получить коэффициенты приёмки всех складов, не собирая список целиком"""
+        # Соблюдаем rate limit для Supplies API
+        await self._ensure_supplies_rate_limit()
+        
+        headers = {
+            'Authorization': api_token
+        }
+        
+        url = f"{self.supplies_url}/api/v1/acceptance/coefficients"
+        async for coeff_data in self._stream_json_items('GET', url, headers):
+            if isinstance(coeff_data, dict):
+                yield coeff_data
+    
     async def get_acceptance_options(self, api_token: str, goods_data: List[Dict[str, Any]], warehouse_id: int = None) -> Dict[str, Any]:
         """Получить опции приёмки для товаров (какие склады и типы упаковки доступны)"""
         # Соблюдаем rate limit для Supplies API
@@ -204,47 +417,35 @@ class WildberriesAPI:
     async def get_available_warehouses_for_monitoring(self, api_token: str, slot_type: str) -> List[Dict[str, Any]]:
         """Получить склады WB доступные для мониторинга с учетом типа поставки"""
         try:
-            # Сначала получаем коэффициенты приемки для всех складов
-            coefficients = await self.get_acceptance_coefficients(api_token)
-            
-            if not coefficients:
-                return []
+            # Проверка соответствия типу поставки выбирается один раз до цикла
+            matches_box_type = BOX_TYPE_FILTERS.get(slot_type, lambda box_type: False)
             
-            # Фильтруем склады по доступности приемки
-            available_warehouses = []
-            
-            for coeff_data in coefficients:
-                # Приёмка доступна только при coefficient 0 или 1 и allowUnload = true
-                if (coeff_data.get('coefficient') in [0, 1] and 
-                    coeff_data.get('allowUnload') is True):
-                    
-                    warehouse_info = {
-                        'id': coeff_data.get('warehouseID'),
-                        'name': coeff_data.get('warehouseName'),
-                        'date': coeff_data.get('date'),
-                        'coefficient': coeff_data.get('coefficient'),
-                        'boxTypeName': coeff_data.get('boxTypeName'),
-                        'boxTypeID': coeff_data.get('boxTypeID'),
-                        'isSortingCenter': coeff_data.get('isSortingCenter', False)
-                    }
-                    
-                    # Проверяем соответствие типу поставки
-                    box_type = coeff_data.get('boxTypeName', '').lower()
-                    
-                    if slot_type == 'both':
-                        available_warehouses.append(warehouse_info)
-                    elif slot_type == 'fbs' and ('коробки' in box_type or 'box' in box_type):
-                        available_warehouses.append(warehouse_info)
-                    elif slot_type == 'fbo' and ('монопаллеты' in box_type or 'суперсейф' in box_type):
-                        available_warehouses.append(warehouse_info)
-            
-            # Убираем дубликаты по ID склада
+            # Фильтруем коэффициенты по мере чтения ответа и сразу убираем дубликаты по ID склада
             seen_ids = set()
             unique_warehouses = []
-            for warehouse in available_warehouses:
-                if warehouse['id'] not in seen_ids:
-                    seen_ids.add(warehouse['id'])
-                    unique_warehouses.append(warehouse)
+            
+            async for coeff_data in self._stream_acceptance_coefficients(api_token):
+                # Приёмка доступна только при coefficient 0 или 1 и allowUnload = true
+                if coeff_data.get('coefficient') not in (0, 1) or coeff_data.get('allowUnload') is not True:
+                    continue
+                
+                warehouse_id = coeff_data.get('warehouseID')
+                if warehouse_id in seen_ids:
+                    continue
+                
+                if not matches_box_type((coeff_data.get('boxTypeName') or '').lower()):
+                    continue
+                
+                seen_ids.add(warehouse_id)
+                unique_warehouses.append({
+                    'id': warehouse_id,
+                    'name': coeff_data.get('warehouseName'),
+                    'date': coeff_data.get('date'),
+                    'coefficient': coeff_data.get('coefficient'),
+                    'boxTypeName': coeff_data.get('boxTypeName'),
+                    'boxTypeID': coeff_data.get('boxTypeID'),
+                    'isSortingCenter': coeff_data.get('isSortingCenter', False)
+                })
             
             return unique_warehouses
             
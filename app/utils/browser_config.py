@@ -1,25 +1,94 @@
 """Конфигурация браузера для защиты от детекции"""
 
+import copy
+from typing import Optional
 from selenium.webdriver.chrome.options import Options
 from selenium import webdriver
 
+from app.config.settings import settings
 
-def create_undetectable_chrome_options(profile_dir: str = None) -> Options:
-    """
-    Создать настройки Chrome с защитой от детекции
-    
-    Args:
-        profile_dir: Путь к директории профиля пользователя
-        
-    Returns:
-        Options: Настройки Chrome
-    """
+# Ресурсы, которые браузеру не нужны для работы с кабинетом WB: картинки, шрифты,
+# медиа и счетчики аналитики. Стили не блокируются - от них зависит видимость элементов
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.webp', '*.gif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.webm',
+    '*google-analytics*', '*googletagmanager*', '*doubleclick*', '*mc.yandex.ru*',
+]
+
+# Скрывает признаки автоматизации (navigator.webdriver, переменные ChromeDriver)
+EVASION_SCRIPT = """
+Object.defineProperty(navigator, 'webdriver', {
+    get: () => undefined,
+});
+
+Object.defineProperty(navigator, 'plugins', {
+    get: () => [1, 2, 3, 4, 5],
+});
+
+Object.defineProperty(navigator, 'languages', {
+    get: () => ['ru-RU', 'ru', 'en'],
+});
+
+delete window.cdc_adoQpoasnfa76pfcZLmcfl_Array;
+delete window.cdc_adoQpoasnfa76pfcZLmcfl_Promise;
+delete window.cdc_adoQpoasnfa76pfcZLmcfl_Symbol;
+"""
+
+# Сколько последних ответов Wildberries хранить в буфере страницы при WB_LOG_NETWORK
+NETWORK_LOG_MAX_ENTRIES = 512
+
+# Перехватывает fetch/XHR к Wildberries и складывает ответы в ограниченный буфер
+# sessionStorage (переживает навигацию в пределах кабинета). Встраивается через
+# Page.addScriptToEvaluateOnNewDocument вместо performance-лога ChromeDriver
+NETWORK_CAPTURE_SCRIPT = """
+(() => {
+    const KEY = '__wbNetworkLog';
+    const MAX_ENTRIES = %d;
+    const record = (method, url, status) => {
+        if (!url || url.indexOf('wildberries.ru') === -1) return;
+        try {
+            const log = JSON.parse(sessionStorage.getItem(KEY) || '[]');
+            log.push({method: method, url: url, status: status});
+            if (log.length > MAX_ENTRIES) log.splice(0, log.length - MAX_ENTRIES);
+            sessionStorage.setItem(KEY, JSON.stringify(log));
+        } catch (e) {}
+    };
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function(input, init) {
+            const method = ((init && init.method) || (input && input.method) || 'GET').toUpperCase();
+            return originalFetch.apply(this, arguments).then(response => {
+                record(method, response.url, response.status);
+                return response;
+            });
+        };
+    }
+    const originalOpen = XMLHttpRequest.prototype.open;
+    XMLHttpRequest.prototype.open = function(method, url) {
+        this.addEventListener('loadend', () => {
+            record(String(method).toUpperCase(), this.responseURL || String(url), this.status);
+        });
+        return originalOpen.apply(this, arguments);
+    };
+})();
+""" % NETWORK_LOG_MAX_ENTRIES
+
+# Забирает накопленные ответы из буфера страницы и очищает его
+NETWORK_LOG_READ_SCRIPT = """
+const log = JSON.parse(sessionStorage.getItem('__wbNetworkLog') || '[]');
+sessionStorage.removeItem('__wbNetworkLog');
+return log;
+"""
+
+# Базовые настройки Chrome без профиля, собираются один раз на процесс
+_BASE_OPTIONS: Optional[Options] = None
+
+
+def _build_base_chrome_options() -> Options:
+    """Собрать общие для всех браузеров настройки Chrome с защитой от детекции"""
     options = Options()
     
-    # Персистентный профиль браузера для сохранения сессии
-    if profile_dir:
-        options.add_argument(f'--user-data-dir={profile_dir}')
-    
     # Настройки для обхода защиты
     options.add_argument('--no-sandbox')
     options.add_argument('--headless')
@@ -29,7 +98,6 @@ def create_undetectable_chrome_options(profile_dir: str = None) -> Options:
     options.add_experimental_option('useAutomationExtension', False)
     options.add_argument('--disable-extensions')
     options.add_argument('--disable-plugins')
-    options.add_argument('--disable-images')
     # НЕ отключаем JavaScript, он нужен для работы сайта WB
     options.add_argument('--disable-gpu')
     options.add_argument('--no-first-run')
@@ -49,8 +117,34 @@ def create_undetectable_chrome_options(profile_dir: str = None) -> Options:
     options.add_argument('--disable-ipc-flooding-protection')
     options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
     
-    # Включаем Performance Logging для отладки
-    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    return options
+
+
+def create_undetectable_chrome_options(profile_dir: str = None) -> Options:
+    """
+    Создать настройки Chrome с защитой от детекции
+    
+    Args:
+        profile_dir: Путь к директории профиля пользователя
+        
+    Returns:
+        Options: Настройки Chrome
+    """
+    global _BASE_OPTIONS
+    if _BASE_OPTIONS is None:
+        _BASE_OPTIONS = _build_base_chrome_options()
+    
+    # Копируем базовые настройки: изменяемые контейнеры клонируем,
+    # чтобы профиль и путь к браузеру не попадали в общий шаблон
+    options = copy.copy(_BASE_OPTIONS)
+    options._arguments = list(_BASE_OPTIONS._arguments)
+    options._extensions = list(_BASE_OPTIONS._extensions)
+    options._experimental_options = dict(_BASE_OPTIONS._experimental_options)
+    options._caps = dict(_BASE_OPTIONS._caps)
+    
+    # Персистентный профиль браузера для сохранения сессии
+    if profile_dir:
+        options._arguments.insert(0, f'--user-data-dir={profile_dir}')
     
     return options
 
@@ -66,22 +160,14 @@ def setup_undetectable_chrome(driver: webdriver.Chrome):
     driver.execute_cdp_cmd('Network.enable', {})
     driver.execute_cdp_cmd('Runtime.enable', {})
     
-    # Выполняем скрипты для обхода защиты
-    driver.execute_script("""
-        Object.defineProperty(navigator, 'webdriver', {
-            get: () => undefined,
-        });
-        
-        Object.defineProperty(navigator, 'plugins', {
-            get: () => [1, 2, 3, 4, 5],
-        });
-        
-        Object.defineProperty(navigator, 'languages', {
-            get: () => ['ru-RU', 'ru', 'en'],
-        });
-        
-        delete window.cdc_adoQpoasnfa76pfcZLmcfl_Array;
-        delete window.cdc_adoQpoasnfa76pfcZLmcfl_Promise;
-        delete window.cdc_adoQpoasnfa76pfcZLmcfl_Symbol;
-    """)
+    # Блокируем загрузку тяжелых ресурсов на уровне сети
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    
+    # Собираем только запросы к WB прямо в странице, без performance-лога ChromeDriver
+    if settings.WB_LOG_NETWORK:
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': NETWORK_CAPTURE_SCRIPT})
+    
+    # Регистрируем скрипт обхода защиты: Chrome выполняет его в каждом новом документе
+    # до скриптов страницы, без повторной инъекции после навигации
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': EVASION_SCRIPT})
 
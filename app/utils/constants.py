@@ -1,2 +1,61 @@
 # Константы приложения
 
+# Селекторы страниц авторизации и кабинета Wildberries
+PHONE_INPUT_SELECTOR = 'input[data-testid="phone-input"]'
+PHONE_SELECTORS = (
+    'input[type="text"]',
+    'input[placeholder*="999"]',
+    'input[inputmode="numeric"]',
+)
+SUBMIT_SELECTORS = (
+    'button[data-testid="submit-phone-button"]',
+    'button[type="submit"]',
+)
+SMS_CODE_INPUT_SELECTOR = 'input[data-testid="sms-code-input"]'
+SMS_CODE_SELECTORS = (
+    'input[type="text"]',
+    'input[name="code"]',
+    'input[placeholder*="код"]',
+    'input[placeholder*="code"]',
+)
+SMS_SUBMIT_SELECTORS = (
+    'button[type="submit"]',
+    '.submit-button',
+    '[data-testid="submit-button"]',
+)
+ERROR_SELECTOR = '.error, .alert, [class*="error"]'
+INN_SELECTORS = (
+    '#taxpayerCode',
+    'input[name="taxpayerCode"]',
+    '[data-testid="taxpayer-code"]',
+)
+SELLER_SELECTORS = (
+    '[data-testid="seller-name"]',
+    '.seller-name',
+    'h1',
+    'h2',
+    '.company-name',
+)
+USER_MARKERS_SELECTOR = '[data-testid*="user"], [class*="header-user"], [class*="profile"]'
+SUPPLIES_TABLE_BODY_SELECTOR = 'table[class^="Table__table"] tbody'
+SUPPLIES_TABLE_ROWS_SELECTOR = 'table[class^="Table__table"] tbody tr'
+SUPPLIES_ORDER_CELL_SELECTOR = 'td:nth-child(1) .Table__td-content__OpbOC9lNW1'
+SUPPLIES_BADGE_SELECTOR = (
+    '.Status-name-cell__8hNdIcukfX [data-name="Badge"], '
+    '.Status-name-cell__status__CtSiazcngL [data-name="Badge"], '
+    'span[data-name="Badge"]'
+)
+SUPPLIES_CELL_SELECTOR = 'td'
+
+# Строки таблицы поставок со статусом "не запланировано": текст последнего бейджа строки,
+# а если бейджей нет - предпоследней ячейки (без учета регистра, как в SUPPLIES_ROWS_SCRIPT)
+_UNPLANNED_TEXT_MATCH = (
+    'contains(translate(normalize-space(%s), "НЕЗАПЛАНИРОВАНО", "незапланировано"), "не запланировано")'
+)
+SUPPLIES_UNPLANNED_ROWS_XPATH = (
+    '//table[starts-with(@class, "Table__table")]//tbody//tr['
+    + _UNPLANNED_TEXT_MATCH % '(.//*[@data-name="Badge"])[last()]'
+    + ' or (not(.//*[@data-name="Badge"]) and '
+    + _UNPLANNED_TEXT_MATCH % 'td[last()-1]'
+    + ')]'
+)
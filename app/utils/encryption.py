@@ -1,7 +1,9 @@
 """AES-256 шифрование данных для безопасного хранения API токенов"""
 
 import base64
+import os
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from loguru import logger
@@ -9,42 +11,67 @@ from loguru import logger
 from app.config.settings import settings
 
 
+# Префикс формата AES-GCM: version(1) + nonce(12) + ciphertext+tag.
+# Старые значения - base64 от токена Fernet, они начинаются с "gAAAAA" и расшифровываются Fernet
+_AESGCM_VERSION = b'\x01'
+_NONCE_SIZE = 12
+
+
+def _load_key() -> bytes:
+    """Декодировать ключ шифрования из настроек (32 байта в base64)"""
+    key_bytes = base64.b64decode(settings.ENCRYPTION_KEY.encode())
+    if len(key_bytes) != 32:
+        raise ValueError("Encryption key must be 32 bytes")
+    return key_bytes
+
+
+# Шифры создаются один раз при импорте модуля:
+# AES-256-GCM для новых значений, Fernet - для расшифровки ранее сохраненных
+try:
+    _KEY_BYTES = _load_key()
+    _AEAD = AESGCM(_KEY_BYTES)
+    _FERNET = Fernet(base64.urlsafe_b64encode(_KEY_BYTES))
+except Exception as e:
+    logger.error(f"Failed to initialize encryption: {e}")
+    raise
+
+
+def encrypt_token(token: str) -> str:
+    """Зашифровать API токен"""
+    # Шифруем токен со случайным nonce
+    nonce = os.urandom(_NONCE_SIZE)
+    encrypted_bytes = _AEAD.encrypt(nonce, token.encode('utf-8'), None)
+    
+    # Возвращаем в base64 для хранения в БД (один слой base64)
+    return base64.b64encode(_AESGCM_VERSION + nonce + encrypted_bytes).decode('utf-8')
+
+
+def decrypt_token(encrypted_token: str) -> str:
+    """Расшифровать API токен"""
+    # Декодируем из base64
+    encrypted_bytes = base64.b64decode(encrypted_token.encode('utf-8'))
+    
+    # Расшифровываем
+    if encrypted_bytes[:1] == _AESGCM_VERSION:
+        nonce = encrypted_bytes[1:1 + _NONCE_SIZE]
+        decrypted_bytes = _AEAD.decrypt(nonce, encrypted_bytes[1 + _NONCE_SIZE:], None)
+    else:
+        # Значение зашифровано прежним форматом (Fernet)
+        decrypted_bytes = _FERNET.decrypt(encrypted_bytes)
+    
+    return decrypted_bytes.decode('utf-8')
+
+
 class EncryptionService:
     """Сервис для шифрования/расшифровки токенов"""
     
     def __init__(self):
-        self._fernet = None
-        self._initialize_encryption()
-    
-    def _initialize_encryption(self):
-        """Инициализация шифрования"""
-        try:
-            # Декодируем ключ из base64
-            key_bytes = base64.b64decode(settings.ENCRYPTION_KEY.encode())
-            
-            if len(key_bytes) != 32:
-                raise ValueError("Encryption key must be 32 bytes")
-            
-            # Создаем Fernet объект
-            self._fernet = Fernet(base64.urlsafe_b64encode(key_bytes))
-            logger.info("Encryption service initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize encryption: {e}")
-            raise
+        logger.info("Encryption service initialized successfully")
     
     def encrypt_token(self, token: str) -> str:
         """Зашифровать API токен"""
         try:
-            if not self._fernet:
-                raise ValueError("Encryption not initialized")
-            
-            # Шифруем токен
-            encrypted_bytes = self._fernet.encrypt(token.encode('utf-8'))
-            
-            # Возвращаем в base64 для хранения в БД
-            return base64.b64encode(encrypted_bytes).decode('utf-8')
-            
+            return encrypt_token(token)
         except Exception as e:
             logger.error(f"Failed to encrypt token: {e}")
             raise
@@ -52,17 +79,7 @@ class EncryptionService:
     def decrypt_token(self, encrypted_token: str) -> str:
         """Расшифровать API токен"""
         try:
-            if not self._fernet:
-                raise ValueError("Encryption not initialized")
-            
-            # Декодируем из base64
-            encrypted_bytes = base64.b64decode(encrypted_token.encode('utf-8'))
-            
-            # Расшифровываем
-            decrypted_bytes = self._fernet.decrypt(encrypted_bytes)
-            
-            return decrypted_bytes.decode('utf-8')
-            
+            return decrypt_token(encrypted_token)
         except Exception as e:
             logger.error(f"Failed to decrypt token: {e}")
             raise
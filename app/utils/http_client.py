@@ -0,0 +1,42 @@
+"""Общий пул HTTP-соединений для всех aiohttp-сессий бота"""
+
+import ssl
+from typing import Optional
+import aiohttp
+import certifi
+
+
+# SSL контекст с certifi для корректной работы с сертификатами. Собирается один раз:
+# разбор CA-бандла дорогой, а контекст безопасно разделять между коннекторами
+_SSL_CTX = ssl.create_default_context(cafile=certifi.where())
+
+# Один TCPConnector на процесс: сессии с разными cookies и заголовками
+# (API клиент, проверка сессий пользователей) используют общие keep-alive соединения
+_SHARED_CONNECTOR: Optional[aiohttp.TCPConnector] = None
+
+
+def get_shared_connector() -> aiohttp.TCPConnector:
+    """
+    Получить общий TCPConnector, создав его при первом обращении
+
+    Сессии должны создаваться с connector_owner=False, чтобы закрытие сессии
+    не закрывало общий пул. Сам пул закрывается в close_shared_connector.
+    """
+    global _SHARED_CONNECTOR
+    if _SHARED_CONNECTOR is None or _SHARED_CONNECTOR.closed:
+        _SHARED_CONNECTOR = aiohttp.TCPConnector(
+            ssl=_SSL_CTX,
+            limit=200,
+            limit_per_host=32,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+    return _SHARED_CONNECTOR
+
+
+async def close_shared_connector():
+    """Закрыть общий пул соединений (вызывается при остановке бота)"""
+    global _SHARED_CONNECTOR
+    if _SHARED_CONNECTOR is not None and not _SHARED_CONNECTOR.closed:
+        await _SHARED_CONNECTOR.close()
+    _SHARED_CONNECTOR = None
@@ -10,6 +10,13 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.bot.main import main
 
+# uvloop заметно снижает накладные расходы цикла событий (недоступен на Windows)
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
@@ -1,2 +1,68 @@
 # Тесты для сервисов
 
+import base64
+import os
+
+import pytest
+
+pytest.importorskip("cryptography")
+pytest.importorskip("pydantic_settings")
+
+# Обязательные настройки для импорта app.config.settings без .env
+os.environ.setdefault("BOT_TOKEN", "test-token")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("ENCRYPTION_KEY", base64.b64encode(os.urandom(32)).decode())
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.exceptions import InvalidTag
+
+from app.config.settings import settings
+from app.utils.encryption import decrypt_token, encrypt_token, get_encryption_service
+
+
+def test_encrypt_token_round_trip():
+    """Значение в формате AES-GCM расшифровывается обратно"""
+    token = "wb-api-token-тест"
+
+    encrypted = encrypt_token(token)
+
+    assert encrypted != token
+    assert base64.b64decode(encrypted)[:1] == b'\x01'
+    assert decrypt_token(encrypted) == token
+    assert get_encryption_service().decrypt_token(encrypted) == token
+
+
+def test_encrypt_token_uses_random_nonce():
+    """Одинаковые токены дают разные шифротексты"""
+    assert encrypt_token("same-token") != encrypt_token("same-token")
+
+
+def test_decrypt_token_reads_legacy_fernet_values():
+    """Значения, сохраненные прежним форматом base64(Fernet(...)), по-прежнему читаются"""
+    key_bytes = base64.b64decode(settings.ENCRYPTION_KEY.encode())
+    fernet = Fernet(base64.urlsafe_b64encode(key_bytes))
+    legacy_value = base64.b64encode(fernet.encrypt("legacy-token".encode('utf-8'))).decode('utf-8')
+
+    assert decrypt_token(legacy_value) == "legacy-token"
+
+
+def test_decrypt_token_rejects_tampered_ciphertext():
+    """Измененный шифротекст не проходит проверку тега AES-GCM"""
+    raw = bytearray(base64.b64decode(encrypt_token("secret-token")))
+    raw[-1] ^= 0x01
+    tampered = base64.b64encode(bytes(raw)).decode('utf-8')
+
+    with pytest.raises(InvalidTag):
+        decrypt_token(tampered)
+
+
+def test_decrypt_token_rejects_tampered_legacy_value():
+    """Измененное значение прежнего формата не проходит проверку Fernet"""
+    key_bytes = base64.b64decode(settings.ENCRYPTION_KEY.encode())
+    fernet = Fernet(base64.urlsafe_b64encode(key_bytes))
+    raw = bytearray(fernet.encrypt(b"legacy-token"))
+    raw[20] = ord('A') if raw[20] != ord('A') else ord('B')
+    tampered = base64.b64encode(bytes(raw)).decode('utf-8')
+
+    with pytest.raises(InvalidToken):
+        decrypt_token(tampered)